@@ -0,0 +1,266 @@
+import atexit
+import collections
+import os
+import queue
+import threading
+import time
+
+
+# Change this (or set HELMET_ARDUINO_PORT / pass --arduino-port) to your Arduino's
+# port, see Device Manager or the Arduino IDE. pyserial URLs such as loop:// also work.
+DEFAULT_PORT = os.environ.get('HELMET_ARDUINO_PORT', 'COM3')
+BAUD_RATE = 9600
+
+# Opening the port resets the board; the sketch needs this long to boot
+RESET_DELAY = 2.0
+
+
+class ArduinoLink:
+    """
+    Persistent, non-blocking serial link to helmet_control_fixed.ino.
+
+    The port is opened once. Signals are queued and written by a background
+    thread that skips a signal identical to the last one written, and a second
+    thread parses the sketch's `Received:` / `Status:` lines as they arrive.
+    """
+
+    def __init__(self, port=DEFAULT_PORT, baudrate=BAUD_RATE, reset_delay=RESET_DELAY,
+                 collapse_repeats=True, verbose=True):
+        self.port = port
+        self.baudrate = baudrate
+        self.reset_delay = reset_delay
+        self.collapse_repeats = collapse_repeats
+        self.verbose = verbose
+        self.connected = False
+        self.error = None
+        self.signals_sent = 0
+        self.signals_collapsed = 0
+        self.write_errors = 0
+        self.last_signal = None
+        self.last_received = None
+        self.last_status = None
+        self.lines = collections.deque(maxlen=50)
+        self._serial = None
+        self._queue = queue.Queue(maxsize=16)
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def open(self):
+        """
+        Open the port and start the writer/reader threads. Returns True when connected.
+        """
+        if self.connected:
+            return True
+        try:
+            import serial  # Deferred so the CLI doesn't pay for pyserial until a port is opened
+            if '://' in str(self.port):
+                self._serial = serial.serial_for_url(self.port, self.baudrate, timeout=0.1)
+            else:
+                self._serial = serial.Serial(self.port, self.baudrate, timeout=0.1)
+        except Exception as e:
+            self.error = e
+            print(f"Warning: Could not connect to Arduino on {self.port}.\nDetails: {e}\n"
+                  "Proceeding without Arduino integration.")
+            return False
+
+        # Only the very first open pays for the board reset
+        time.sleep(self.reset_delay)
+        self.connected = True
+        self._stop.clear()
+        for target, name in ((self._write_loop, 'arduino-writer'), (self._read_loop, 'arduino-reader')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        print(f"✅ Arduino connected on {self.port}")
+        return True
+
+    def send(self, signal):
+        """
+        Queue a raw signal (b'1' or b'0') without blocking the caller.
+        """
+        if not self.connected:
+            return False
+        try:
+            self._queue.put_nowait(signal)
+        except queue.Full:
+            # Only the newest decision matters; drop the oldest queued one
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()  # The dropped signal will never reach the writer
+            except queue.Empty:
+                pass
+            self._queue.put_nowait(signal)
+        return True
+
+    def send_verdict(self, verdict):
+        """
+        Queue the signal for a PASS/FAIL/CONFLICT/NO_DETECTION verdict.
+        """
+        from verdict import ARDUINO_SIGNALS
+        return self.send(ARDUINO_SIGNALS.get(verdict, b'0'))
+
+    def flush(self, timeout=2.0):
+        """
+        Wait until every queued signal has been written.
+        """
+        deadline = time.monotonic() + timeout
+        while self.connected and time.monotonic() < deadline:
+            if self._queue.unfinished_tasks == 0:
+                return True
+            time.sleep(0.01)
+        return self._queue.unfinished_tasks == 0
+
+    def close(self):
+        if not self.connected:
+            return
+        self.flush()
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=1)
+        self._threads = []
+        self.connected = False
+        try:
+            self._serial.close()
+        except Exception:
+            pass
+        print("[ARDUINO] Connection closed")
+
+    def stats(self):
+        return {
+            'port': self.port,
+            'connected': self.connected,
+            'signals_sent': self.signals_sent,
+            'signals_collapsed': self.signals_collapsed,
+            'write_errors': self.write_errors,
+            'last_received': self.last_received,
+            'last_status': self.last_status,
+        }
+
+    def _write_loop(self):
+        while not self._stop.is_set():
+            try:
+                signal = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            try:
+                if self.collapse_repeats and signal == self.last_signal:
+                    self.signals_collapsed += 1
+                    continue
+                with self._lock:
+                    self._serial.write(signal)
+                self.last_signal = signal
+                self.signals_sent += 1
+                if self.verbose:
+                    print(f"[ARDUINO] Sent signal: {signal.decode()} (1=PASS, 0=FAIL)")
+            except Exception as e:
+                self.write_errors += 1
+                print(f"[ARDUINO] Error sending signal: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _read_loop(self):
+        buffer = b''
+        while not self._stop.is_set():
+            try:
+                chunk = self._serial.read(self._serial.in_waiting or 1)
+            except Exception as e:
+                self.error = e
+                return
+            if not chunk:
+                continue
+            buffer += chunk
+            while b'\n' in buffer:
+                raw, buffer = buffer.split(b'\n', 1)
+                self._handle_line(raw.decode(errors='replace').strip())
+
+    def _handle_line(self, line):
+        if not line:
+            return
+        self.lines.append(line)
+        if line.startswith('Received:'):
+            self.last_received = line.split(':', 1)[1].strip()
+        elif line.startswith('Status:'):
+            self.last_status = line.split(':', 1)[1].strip()
+            if self.verbose:
+                print(f"[ARDUINO] Response: {line}")
+
+
+class SketchEmulator:
+    """
+    Pseudo-terminal stand-in for the Arduino running helmet_control_fixed.ino (POSIX only).
+
+    Use it as a context manager and point ArduinoLink at `emulator.port`;
+    it answers '1'/'0' with the same lines the sketch prints.
+    """
+
+    def __init__(self, beep_delay=0.0):
+        self.beep_delay = beep_delay
+        self.received = []
+        self.port = None
+        self._master = None
+        self._slave = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        import pty
+        import tty
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.port = os.ttyname(self._slave)
+        self._thread = threading.Thread(target=self._run, name='sketch-emulator', daemon=True)
+        self._thread.start()
+        self._println("=== Helmet Detection Arduino Ready ===")
+        self._println("Waiting for signals (1=helmet, 0=no helmet)...")
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join(timeout=1)
+        os.close(self._master)
+        os.close(self._slave)
+
+    def _println(self, text):
+        os.write(self._master, (text + '\r\n').encode())
+
+    def _run(self):
+        import select
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.1)
+            if not ready:
+                continue
+            for byte in os.read(self._master, 64):
+                self._respond(chr(byte))
+
+    def _respond(self, data):
+        self.received.append(data)
+        self._println(f"Received: {data}")
+        if data == '1':
+            self._println("HELMET DETECTED - Starting bike engine")
+            self._println("Status: Motor running, LED off, Buzzer off")
+        elif data == '0':
+            self._println("NO HELMET - Stopping bike and alerting")
+            self._println("Buzzer alert starting...")
+            for i in range(3):
+                time.sleep(self.beep_delay)
+                self._println(f"Beep {i + 1}")
+            self._println("Status: Motor stopped, LED on, Buzzer alerted")
+        else:
+            self._println(f"Invalid signal: {data}")
+        self._println("Ready for next signal...")
+
+
+_shared_link = None
+
+
+def get_arduino_link(port=None):
+    """
+    Return the process-wide ArduinoLink, opening the port on first use.
+    """
+    global _shared_link
+    if _shared_link is None:
+        _shared_link = ArduinoLink(port or DEFAULT_PORT)
+        _shared_link.open()
+        atexit.register(_shared_link.close)
+    return _shared_link
@@ -0,0 +1,221 @@
+import cv2
+import csv
+import glob
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from helmet_detector import get_detector
+from profiling import NULL_PROFILER
+from result_cache import file_hash
+from stream import list_images
+from verdict import CONFIDENCE_THRESHOLD, summarize_batch
+
+# Ultralytics letterboxes to 640 anyway, so workers shrink large images before
+# shipping them back to the main process.
+MAX_SIDE = 640
+
+CSV_FIELDS = ['image', 'verdict', 'num_detections', 'detections', 'decode_ms', 'infer_ms', 'error', 'cached']
+
+
+def resolve_inputs(pattern):
+    """
+    Expand a directory or glob pattern into a sorted list of image paths.
+    """
+    if os.path.isdir(pattern):
+        return list_images(pattern)
+    return sorted(p for p in glob.glob(pattern, recursive=True) if os.path.isfile(p))
+
+
+def load_image(path, max_side=MAX_SIDE):
+    """
+    Decode one image and downscale it so its longest side is at most max_side.
+    Runs in a worker process; returns (path, frame, scale, decode_ms, error).
+    """
+    start = time.perf_counter()
+    frame = cv2.imread(path)
+    if frame is None:
+        return path, None, 1.0, (time.perf_counter() - start) * 1000, 'could not decode image'
+    scale = 1.0
+    longest = max(frame.shape[:2])
+    if max_side and longest > max_side:
+        scale = max_side / longest
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return path, frame, scale, (time.perf_counter() - start) * 1000, None
+
+
+def bounded_map(pool, fn, items, window, *args):
+    """
+    Like pool.map(fn, items), in order, but with at most `window` calls in flight,
+    so results are only produced as fast as the caller consumes them.
+    """
+    pending = deque()
+    try:
+        for item in items:
+            pending.append(pool.submit(fn, item, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:  # Caller stopped early
+            future.cancel()
+
+
+class ResultWriter:
+    """
+    Streams one row per image to a CSV or JSONL file, chosen by extension.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jsonl = path.lower().endswith(('.jsonl', '.json'))
+        self._file = open(path, 'w', newline='', encoding='utf-8')
+        self._csv = None
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+            self._csv.writeheader()
+
+    def write(self, row):
+        if self.jsonl:
+            self._file.write(json.dumps(row) + '\n')
+        else:
+            self._csv.writerow(dict(row, detections=json.dumps(row['detections'])))
+
+    def close(self):
+        self._file.close()
+
+
+class OrderedRows:
+    """
+    Hands rows to a ResultWriter in input order, holding back any that are ready early
+    (cache hits and decode errors overtake images still waiting for their batch).
+    """
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.next_index = 0
+        self._held = {}
+
+    def write(self, index, row):
+        self._held[index] = row
+        while self.next_index in self._held:
+            self.writer.write(self._held.pop(self.next_index))
+            self.next_index += 1
+
+
+def _flush(detector, pending, writer, threshold, profiler, cache=None):
+    frames = [item[2] for item in pending]
+    start = time.perf_counter()
+    results = detector.detect_batch(frames)
+    elapsed = time.perf_counter() - start
+    profiler.record('infer', elapsed)
+    infer_ms = elapsed * 1000 / len(frames)
+    with profiler.stage('postprocess'):
+        summaries = summarize_batch(results, threshold)
+    verdicts = {}
+    save_start = time.perf_counter()
+    for (index, path, _, scale, decode_ms, key), summary in zip(pending, summaries):
+        rows = summary['rows'].copy()
+        rows[:, :4] /= scale  # Back to original image coordinates
+        verdict = summary['verdict']
+        verdicts[verdict] = verdicts.get(verdict, 0) + 1
+        if cache is not None and key is not None:
+            cache.put(key, rows, verdict)
+        writer.write(index, {
+            'image': path,
+            'verdict': verdict,
+            'num_detections': summary['num_detections'],
+            'detections': np.round(rows.astype(np.float64), 4).tolist(),
+            'decode_ms': round(decode_ms, 2),
+            'infer_ms': round(infer_ms, 2),
+            'error': None,
+            'cached': False,
+        })
+    profiler.record('save', time.perf_counter() - save_start)
+    return verdicts
+
+
+def batch_helmet_detection(pattern, output='batch_results.csv', detector=None, batch_size=16,
+                           workers=None, threshold=CONFIDENCE_THRESHOLD, max_side=MAX_SIDE,
+                           profiler=NULL_PROFILER, cache=None):
+    """
+    Score every image matched by `pattern` and stream one row per image to `output`.
+    Decoding runs in a process pool, at most `batch_size * workers` images ahead,
+    while the main process feeds fixed-size batches to the model.
+    Timings are recorded per batch (infer/postprocess/save) and per image (preprocess = worker decode).
+    With a ResultCache, files are hashed first and cache hits skip decoding and inference.
+    Rows are written in input order either way.
+    """
+    paths = resolve_inputs(pattern)
+    if not paths:
+        print(f"Error: No images matched {pattern}")
+        return None
+
+    if detector is None:
+        detector = get_detector()
+
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    print(f"[BATCH] {len(paths)} images, batch size {batch_size}, {workers} decode workers")
+
+    writer = ResultWriter(output)
+    ordered = OrderedRows(writer)
+    totals = {}
+    errors = 0
+    pending = []
+    started = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, min(32, len(paths) // (workers * 4) or 1))
+            todo = list(enumerate(paths))
+            keys = {}
+            if cache is not None:
+                todo = []
+                for index, (path, digest) in enumerate(zip(paths, pool.map(file_hash, paths, chunksize=chunksize))):
+                    key = keys[path] = cache.key(digest) if digest else None
+                    hit = cache.get(key) if key else None
+                    if hit is None:
+                        todo.append((index, path))
+                        continue
+                    rows, verdict = hit
+                    totals[verdict] = totals.get(verdict, 0) + 1
+                    ordered.write(index, {'image': path, 'verdict': verdict, 'num_detections': len(rows),
+                                          'detections': np.round(rows.astype(np.float64), 4).tolist(),
+                                          'decode_ms': None, 'infer_ms': None, 'error': None, 'cached': True})
+
+            # Decoded frames only pile up to about one batch per worker ahead of inference
+            loaded = bounded_map(pool, load_image, [path for _, path in todo], batch_size * workers, max_side)
+            for (index, _), (path, frame, scale, decode_ms, error) in zip(todo, loaded):
+                profiler.record('preprocess', decode_ms / 1000.0)
+                if error is not None:
+                    errors += 1
+                    ordered.write(index, {'image': path, 'verdict': None, 'num_detections': 0, 'detections': [],
+                                          'decode_ms': round(decode_ms, 2), 'infer_ms': None, 'error': error,
+                                          'cached': False})
+                    continue
+                pending.append((index, path, frame, scale, decode_ms, keys.get(path)))
+                if len(pending) == batch_size:
+                    for verdict, count in _flush(detector, pending, ordered, threshold, profiler, cache).items():
+                        totals[verdict] = totals.get(verdict, 0) + count
+                    pending = []
+            if pending:
+                for verdict, count in _flush(detector, pending, ordered, threshold, profiler, cache).items():
+                    totals[verdict] = totals.get(verdict, 0) + count
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - started
+    rate = len(paths) / elapsed if elapsed > 0 else 0.0
+    print("[BATCH] Verdicts: " + ", ".join(f"{k}={v}" for k, v in sorted(totals.items())))
+    if errors:
+        print(f"[BATCH] {errors} image(s) could not be decoded")
+    if cache is not None:
+        cache.print_stats()
+    print(f"[BATCH] Wrote {output}")
+    print(f"[BATCH] {len(paths)} images in {elapsed:.1f}s - {rate:.1f} images/sec")
+    return {'images': len(paths), 'verdicts': totals, 'errors': errors,
+            'seconds': elapsed, 'images_per_sec': rate}
@@ -0,0 +1,92 @@
+"""
+Micro-benchmark: per-box Python loop vs vectorised verdict post-processing.
+
+Usage: python scripts/bench_postprocess.py [--boxes 50] [--batch 16] [--repeat 2000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from helmet_detector import CLASS_NAMES
+from verdict import summarize_batch, summarize_detections
+
+try:
+    import torch
+except ImportError:  # The benchmark still runs on plain NumPy rows
+    torch = None
+
+
+def legacy_verdict(detections, threshold=0.5):
+    """
+    The original per-row loop from detect.py, without the prints.
+    """
+    helmet_detected = False
+    no_helmet_detected = False
+    max_conf = {}
+    for det in detections:
+        x1, y1, x2, y2, confidence, class_id = det
+        class_id = int(class_id)
+        class_name = CLASS_NAMES.get(class_id, 'unknown')
+        confidence = float(confidence)
+        max_conf[class_id] = max(max_conf.get(class_id, 0.0), confidence)
+        if confidence > threshold:
+            if class_name == 'With Helmet':
+                helmet_detected = True
+            elif class_name == 'Without Helmet':
+                no_helmet_detected = True
+    if helmet_detected and not no_helmet_detected:
+        return 'PASS'
+    if no_helmet_detected and not helmet_detected:
+        return 'FAIL'
+    if helmet_detected and no_helmet_detected:
+        return 'CONFLICT'
+    return 'NO_DETECTION'
+
+
+def make_rows(n, rng):
+    rows = np.zeros((n, 6), dtype=np.float32)
+    rows[:, :2] = rng.uniform(0, 600, (n, 2))
+    rows[:, 2:4] = rows[:, :2] + rng.uniform(10, 80, (n, 2))
+    rows[:, 4] = rng.uniform(0.05, 1.0, n)
+    rows[:, 5] = rng.integers(0, 2, n)
+    return torch.from_numpy(rows) if torch is not None else rows
+
+
+def bench(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--boxes', type=int, default=50, help="detections per image")
+    parser.add_argument('--batch', type=int, default=16, help="images per batch")
+    parser.add_argument('--repeat', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    single = make_rows(args.boxes, rng)
+    batch = [make_rows(args.boxes, rng) for _ in range(args.batch)]
+
+    # Both implementations must agree before timing means anything
+    for rows in batch + [single]:
+        assert legacy_verdict(rows) == summarize_detections(rows)['verdict']
+    assert [legacy_verdict(r) for r in batch] == [s['verdict'] for s in summarize_batch(batch)]
+
+    backend = 'torch' if torch is not None else 'numpy'
+    print(f"Post-processing benchmark ({backend} rows, {args.boxes} boxes/image, {args.repeat} repeats)")
+    loop_us = bench(lambda: legacy_verdict(single), args.repeat)
+    vec_us = bench(lambda: summarize_detections(single), args.repeat)
+    print(f"  single image  loop: {loop_us:8.1f} us   vectorised: {vec_us:8.1f} us   ({loop_us / vec_us:.1f}x)")
+
+    repeat = max(1, args.repeat // args.batch)
+    loop_us = bench(lambda: [legacy_verdict(r) for r in batch], repeat)
+    vec_us = bench(lambda: summarize_batch(batch), repeat)
+    print(f"  batch of {args.batch:<3}  loop: {loop_us:8.1f} us   vectorised: {vec_us:8.1f} us   ({loop_us / vec_us:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
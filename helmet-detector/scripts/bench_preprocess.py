@@ -0,0 +1,98 @@
+"""
+Micro-benchmark: the original per-capture preprocessing in live_helmet_detection()
+vs the shared Preprocessor (downscaled metrics, persistent CLAHE, reused buffers).
+
+Each "capture" is what the webcam path does per decision: quality metrics on
+the test frame and 3 candidates, then enhancement of the best one.
+
+Usage: python scripts/bench_preprocess.py [--images dataset/test/images] [--count 20] [--repeat 20]
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+from preprocess import Preprocessor, confidence_for, frame_quality, quality_score
+from stream import list_images
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGES = os.path.join(script_dir, '..', 'dataset', 'test', 'images')
+
+
+def legacy_metrics(frame):
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return frame.mean(), gray.std(), cv2.Laplacian(gray, cv2.CV_64F).var()
+
+
+def legacy_capture(frames):
+    """
+    The original code path from detect.py, without the prints.
+    """
+    mean_brightness, _, blur_level = legacy_metrics(frames[0])
+    best_frame, best_quality = None, 0
+    for frame in frames[1:]:
+        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        score = gray_frame.std() + cv2.Laplacian(gray_frame, cv2.CV_64F).var() * 0.1
+        if score > best_quality:
+            best_quality, best_frame = score, frame.copy()
+    processed = best_frame.copy()
+    if mean_brightness < 100:
+        lab = cv2.cvtColor(processed, cv2.COLOR_BGR2LAB)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        lab[:, :, 0] = clahe.apply(lab[:, :, 0])
+        processed = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
+        processed = cv2.convertScaleAbs(processed, alpha=1.2, beta=20)
+    if blur_level < 150:
+        kernel = np.array([[-1, -1, -1], [-1, 9, -1], [-1, -1, -1]])
+        processed = cv2.filter2D(processed, -1, kernel)
+    return cv2.cvtColor(processed, cv2.COLOR_BGR2RGB)
+
+
+def shared_capture(frames, preprocessor):
+    brightness, _, blur = frame_quality(frames[0])
+    confidence_for(brightness, blur)
+    best_frame, best_quality = None, 0
+    for frame in frames[1:]:
+        _, contrast, frame_blur = frame_quality(frame)
+        score = quality_score(contrast, frame_blur)
+        if score > best_quality:
+            best_quality, best_frame = score, frame
+    return preprocessor.enhance(best_frame, *preprocessor.needs(brightness, blur))
+
+
+def bench(fn, captures, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frames in captures:
+            fn(frames)
+    return (time.perf_counter() - start) / (repeat * len(captures)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', default=DEFAULT_IMAGES)
+    parser.add_argument('--count', type=int, default=20, help="images used as captures")
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--size', default='640x480', help="webcam frame size WxH")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.size.split('x'))
+    frames = [cv2.imread(p) for p in list_images(args.images)[:args.count]]
+    frames = [cv2.resize(f, (width, height)) for f in frames if f is not None]
+    if not frames:
+        raise SystemExit(f"Error: No images found in {args.images}")
+
+    preprocessor = Preprocessor()
+    print(f"Preprocessing benchmark ({len(frames)} captures of 4 frames at {width}x{height}, {args.repeat} repeats)")
+    for label, scale in (('good light', 1.0), ('low light', 0.35)):
+        captures = [[(f * scale).astype(np.uint8)] * 4 for f in frames]
+        legacy_ms = bench(legacy_capture, captures, args.repeat)
+        shared_ms = bench(lambda c: shared_capture(c, preprocessor), captures, args.repeat)
+        print(f"  {label:<10}  original: {legacy_ms:7.2f} ms   shared: {shared_ms:7.2f} ms   "
+              f"({legacy_ms / shared_ms:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
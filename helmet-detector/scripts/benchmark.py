@@ -0,0 +1,260 @@
+"""
+Reproducible benchmark of the detection pipeline on the bundled images.
+
+Measures model load time, cold (first call after load) and warm single-image
+latency, batched throughput at several batch sizes, decode / preprocessing /
+post-processing cost, end-to-end FPS on a synthetic video built from the same
+images, and peak RSS. Results are written as JSON; with --baseline the run is
+compared against an earlier result and the exit status is 1 when any metric
+regressed by more than --tolerance.
+
+Usage:
+  python scripts/benchmark.py [--output bench.json] [--backend onnx --int8]
+  python scripts/benchmark.py --baseline bench_main.json --tolerance 0.10
+  python scripts/benchmark.py --compare bench_new.json --baseline bench_main.json
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from helmet_detector import BACKENDS, HelmetDetector, model_path_for
+from preprocess import frame_quality, get_preprocessor
+from profiling import StageProfiler
+from stream import iter_frames, list_images
+from verdict import summarize_batch, summarize_detections
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SOURCES = (os.path.join(script_dir, '..', 'input'),
+                   os.path.join(script_dir, '..', 'dataset', 'test', 'images'))
+DEFAULT_BATCH_SIZES = (1, 4, 8, 16)
+VIDEO_SIZE = (640, 480)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB, or None where it can't be read.
+    """
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+    try:
+        import psutil
+    except ImportError:
+        return None
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1024 * 1024)
+
+
+def collect_images(sources, count):
+    paths = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths.extend(list_images(source))
+        elif os.path.isfile(source):
+            paths.append(source)
+    return paths[:count]
+
+
+def write_video(frames, path, length, fps=15):
+    """
+    Synthetic clip: the benchmark images at webcam resolution, looped to `length` frames.
+    """
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'MJPG'), fps, VIDEO_SIZE)
+    if not writer.isOpened():
+        raise RuntimeError(f"could not open a video writer for {path}")
+    resized = [cv2.resize(f, VIDEO_SIZE) for f in frames]
+    for i in range(length):
+        writer.write(resized[i % len(resized)])
+    writer.release()
+
+
+def run_benchmark(sources=DEFAULT_SOURCES, count=50, repeat=3, batch_sizes=DEFAULT_BATCH_SIZES,
+                  video_frames=150, backend='torch', int8=False):
+    """
+    Run every section once and return the results dict (see module docstring).
+    """
+    paths = collect_images(sources, count)
+    if not paths:
+        raise SystemExit(f"Error: No images found in {', '.join(sources)}")
+    profiler = StageProfiler(window=100000)
+    metrics = {}
+
+    # Decode
+    for _ in range(repeat):
+        frames = []
+        for path in paths:
+            with profiler.stage('decode'):
+                frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    print(f"[BENCH] {len(frames)} images from {', '.join(sources)}")
+
+    # Model load, then the first (cold) call, which pays for lazy initialisation
+    model_path = model_path_for(backend, int8)
+    started = time.perf_counter()
+    detector = HelmetDetector(model_path, warmup=False)
+    metrics['model_load_ms'] = (time.perf_counter() - started) * 1000
+    metrics['rss_after_load_mb'] = peak_rss_mb()
+    started = time.perf_counter()
+    detector.detect(frames[0])
+    metrics['cold_latency_ms'] = (time.perf_counter() - started) * 1000
+    print(f"[BENCH] Model load {metrics['model_load_ms']:.0f} ms, cold call {metrics['cold_latency_ms']:.1f} ms")
+
+    # Warm single-image latency, keeping the last results for the post-processing section
+    results = []
+    for _ in range(repeat):
+        results = []
+        for frame in frames:
+            with profiler.stage('infer'):
+                results.append(detector.detect(frame))
+
+    # Preprocessing: quality metrics and adaptive enhancement, as on the webcam path
+    preprocessor = get_preprocessor()
+    for _ in range(repeat):
+        for frame in frames:
+            with profiler.stage('preprocess'):
+                brightness, _, blur = frame_quality(frame)
+                preprocessor.enhance(frame, *preprocessor.needs(brightness, blur))
+
+    # Post-processing on real model output
+    rows = [r.boxes.data for r in results]
+    for _ in range(repeat * 10):
+        for detections in rows:
+            with profiler.stage('postprocess'):
+                summarize_detections(detections)
+
+    # Batched throughput
+    for size in batch_sizes:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            for i in range(0, len(frames), size):
+                summarize_batch(r.boxes.data for r in detector.detect_batch(frames[i:i + size]))
+        fps = repeat * len(frames) / (time.perf_counter() - started)
+        metrics[f'batch{size}_fps'] = fps
+        print(f"[BENCH] Batch size {size:>3}: {fps:7.1f} images/s")
+
+    # End-to-end on a synthetic clip: decode, infer and verdict for every frame
+    if video_frames:
+        with tempfile.TemporaryDirectory() as tmp:
+            video = os.path.join(tmp, 'bench.avi')
+            write_video(frames, video, video_frames)
+            started = time.perf_counter()
+            processed = 0
+            for _, frame in iter_frames(video, realtime=False):
+                with profiler.stage('video_frame'):
+                    summarize_detections(detector.detect(frame).boxes.data)
+                processed += 1
+            metrics['video_fps'] = processed / (time.perf_counter() - started)
+        print(f"[BENCH] Synthetic video: {processed} frames at {metrics['video_fps']:.1f} FPS")
+
+    stages = profiler.report()['stages']
+    for name, stats in stages.items():
+        metrics[f'{name}_mean_ms'] = stats['mean_ms']
+        metrics[f'{name}_p50_ms'] = stats['p50_ms']
+        metrics[f'{name}_p95_ms'] = stats['p95_ms']
+    metrics['peak_rss_mb'] = peak_rss_mb()
+
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'opencv': cv2.__version__,
+            'numpy': np.__version__,
+        },
+        'config': {
+            'model': os.path.relpath(model_path, script_dir),
+            'backend': backend,
+            'int8': int8,
+            'images': len(frames),
+            'repeat': repeat,
+            'batch_sizes': list(batch_sizes),
+            'video_frames': video_frames,
+        },
+        'metrics': {k: v for k, v in metrics.items() if v is not None},
+    }
+
+
+def compare(current, baseline, tolerance=0.10, noise_ms=0.1):
+    """
+    Print current vs baseline for every shared metric and return the names of regressions.
+
+    `_fps` metrics regress when they drop by more than `tolerance`; everything
+    else (times, memory) when it grows by more than `tolerance`. Timing changes
+    smaller than `noise_ms` are never flagged.
+    """
+    if current.get('config') != baseline.get('config'):
+        print("⚠️ WARNING: benchmark configuration differs from the baseline, comparison may be meaningless")
+    regressions = []
+    print(f"\n{'metric':<26}{'baseline':>12}{'current':>12}{'change':>9}")
+    for name, old in baseline['metrics'].items():
+        new = current['metrics'].get(name)
+        if new is None:
+            continue
+        change = (new - old) / old if old else 0.0
+        worse = -change if name.endswith('_fps') else change
+        regressed = worse > tolerance and not (name.endswith('_ms') and abs(new - old) < noise_ms)
+        if regressed:
+            regressions.append(name)
+        print(f"{name:<26}{old:>12.2f}{new:>12.2f}{change:>+9.1%}{'  REGRESSION' if regressed else ''}")
+    if regressions:
+        print(f"\n❌ {len(regressions)} metric(s) regressed by more than {tolerance:.0%}: {', '.join(regressions)}")
+    else:
+        print(f"\n✅ No regressions beyond {tolerance:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--images', nargs='+', default=list(DEFAULT_SOURCES),
+                        help="image directories or files (default: input/ and dataset/test/images)")
+    parser.add_argument('--count', type=int, default=50, help="images used from the sources")
+    parser.add_argument('--repeat', type=int, default=3, help="passes over the images per section")
+    parser.add_argument('--batch-sizes', default=','.join(str(b) for b in DEFAULT_BATCH_SIZES))
+    parser.add_argument('--video-frames', type=int, default=150, help="length of the synthetic clip (0 to skip)")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--int8', action='store_true')
+    parser.add_argument('--output', default='benchmark.json', help="results JSON (default: %(default)s)")
+    parser.add_argument('--baseline', help="earlier results JSON to compare against")
+    parser.add_argument('--compare', metavar='RESULTS_JSON',
+                        help="compare this results JSON with --baseline instead of running the benchmark")
+    parser.add_argument('--tolerance', type=float, default=0.10, help="allowed relative slowdown (default: 10%%)")
+    parser.add_argument('--noise-ms', type=float, default=0.1, help="ignore timing changes smaller than this")
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline:
+            parser.error("--compare needs --baseline")
+        with open(args.compare, encoding='utf-8') as f:
+            results = json.load(f)
+    else:
+        batch_sizes = [int(b) for b in args.batch_sizes.split(',')]
+        results = run_benchmark(args.images, args.count, args.repeat, batch_sizes, args.video_frames,
+                                args.backend, args.int8)
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[BENCH] Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance, args.noise_ms):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,446 @@
+"""
+Decode-once image cache and parallel augmentation loader for retraining.
+
+`build` decodes every image of a split once, letterboxes it to imgsz x imgsz
+(padded with gray 114, as Ultralytics does) and writes them all into one
+memory-mapped uint8 array. The labels come from the label index, so
+segmentation polygons arrive as boxes, and are stored in letterboxed pixels:
+
+  images.npy        (n_images, imgsz, imgsz, 3) uint8 BGR
+  names.npy         image stem per image
+  box_offsets.npy   (n_images + 1) start of each image's boxes
+  boxes.npy         letterboxed pixel xyxy per object
+  classes.npy       class id per object
+
+`bench` runs epochs over the cache: worker processes each map the array once
+and apply fast augmentations (affine scale/translate, HSV jitter, horizontal
+flip, with the hyperparameters of runs/detect/train/args.yaml) to shuffled
+batches. It reports epoch time and images/s, optionally against decoding
+the JPEGs every epoch.
+
+Usage:
+  python scripts/dataset_cache.py build [--split train valid] [--imgsz 640] [--workers 8]
+  python scripts/dataset_cache.py bench --split train [--epochs 3] [--batch 16] [--workers 8] [--compare-decode]
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from label_index import DATASET_DIR, INDEX_DIR, LabelIndex, is_stale as labels_stale
+from stream import list_images
+
+CACHE_VERSION = 1
+DEFAULT_IMGSZ = 640
+PAD_VALUE = 114
+TRAIN_ARGS = os.path.join(DATASET_DIR, 'runs', 'detect', 'train', 'args.yaml')
+
+# Ultralytics defaults, overridden by whatever runs/detect/train/args.yaml says
+DEFAULT_HYP = {'hsv_h': 0.015, 'hsv_s': 0.7, 'hsv_v': 0.4, 'translate': 0.1, 'scale': 0.5, 'fliplr': 0.5}
+
+# Augmented boxes smaller than this (pixels), or keeping less than this share of their area, are dropped
+MIN_BOX_SIDE = 2
+MIN_AREA_KEPT = 0.1
+
+
+def images_dir(split):
+    return os.path.join(DATASET_DIR, split, 'images')
+
+
+def cache_dir(split, imgsz=DEFAULT_IMGSZ):
+    return os.path.join(INDEX_DIR, f'images_{split}_{imgsz}')
+
+
+def load_hyp(path=TRAIN_ARGS):
+    """
+    Augmentation hyperparameters from a training args.yaml (flat `key: value` lines).
+    """
+    hyp = dict(DEFAULT_HYP)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                if key.strip() in hyp:
+                    hyp[key.strip()] = float(value)
+    return hyp
+
+
+def letterbox(frame, imgsz=DEFAULT_IMGSZ):
+    """
+    (imgsz x imgsz image, ratio, (pad_x, pad_y)): aspect-preserving resize, centred on gray padding.
+    """
+    h, w = frame.shape[:2]
+    ratio = min(imgsz / h, imgsz / w)
+    new_w, new_h = max(1, round(w * ratio)), max(1, round(h * ratio))
+    if (new_w, new_h) != (w, h):
+        frame = cv2.resize(frame, (new_w, new_h), interpolation=cv2.INTER_AREA if ratio < 1 else cv2.INTER_LINEAR)
+    pad_x, pad_y = (imgsz - new_w) // 2, (imgsz - new_h) // 2
+    out = np.full((imgsz, imgsz, 3), PAD_VALUE, dtype=np.uint8)
+    out[pad_y:pad_y + new_h, pad_x:pad_x + new_w] = frame
+    return out, ratio, (pad_x, pad_y)
+
+
+def to_letterbox_pixels(boxes, shape, ratio, pad):
+    """
+    Normalized xyxy boxes of an (h, w) image to pixel xyxy in its letterboxed version.
+    """
+    h, w = shape
+    scale = np.array([w, h, w, h], dtype=np.float32) * ratio
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) * scale + np.array([*pad, *pad], dtype=np.float32)
+
+
+def _decode_chunk(task):
+    """
+    Worker: decode and letterbox images straight into rows of the shared memmap.
+    Returns ((h, w), ratio, pad) per image, or None for images that failed to decode.
+    """
+    paths, start, array_path, imgsz = task
+    images = np.load(array_path, mmap_mode='r+')
+    geometry = []
+    for i, path in enumerate(paths):
+        frame = cv2.imread(path)
+        if frame is None:
+            images[start + i] = PAD_VALUE
+            geometry.append(None)
+            continue
+        images[start + i], ratio, pad = letterbox(frame, imgsz)
+        geometry.append((frame.shape[:2], ratio, pad))
+    images.flush()
+    return geometry
+
+
+def source_state(split):
+    """
+    (image count, newest mtime_ns) of a split's images directory.
+    """
+    directory = images_dir(split)
+    newest = os.stat(directory).st_mtime_ns
+    count = 0
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file():
+                count += 1
+                newest = max(newest, entry.stat().st_mtime_ns)
+    return count, newest
+
+
+def is_stale(split, imgsz=DEFAULT_IMGSZ):
+    """
+    True when the cache is missing, from another version, or older than the images or labels.
+    """
+    meta_path = os.path.join(cache_dir(split, imgsz), 'meta.json')
+    if not os.path.exists(meta_path) or labels_stale(split):
+        return True
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    with open(os.path.join(INDEX_DIR, f'labels_{split}', 'meta.json'), encoding='utf-8') as f:
+        labels_newest = json.load(f)['newest_mtime_ns']
+    count, newest = source_state(split)
+    return (meta.get('version') != CACHE_VERSION or meta.get('files') != count
+            or meta.get('newest_mtime_ns') != newest or meta.get('labels_mtime_ns') != labels_newest)
+
+
+def build_cache(split, imgsz=DEFAULT_IMGSZ, workers=None, chunk=64):
+    """
+    Decode, letterbox and store every image of `split` once; returns the cache directory.
+    """
+    started = time.perf_counter()
+    paths = list_images(images_dir(split))
+    if not paths:
+        raise FileNotFoundError(f"No images in {images_dir(split)}")
+    labels = LabelIndex(split)  # Rebuilds the label index first if any label changed
+    count, newest = source_state(split)
+
+    target = cache_dir(split, imgsz)
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    array_path = os.path.join(tmp, 'images.npy')
+    size_gb = len(paths) * imgsz * imgsz * 3 / 1024 ** 3
+    print(f"[CACHE] Decoding {len(paths)} {split} images into {size_gb:.1f} GB at {imgsz}x{imgsz}...")
+    images = np.lib.format.open_memmap(array_path, mode='w+', dtype=np.uint8, shape=(len(paths), imgsz, imgsz, 3))
+    del images  # Workers write through their own mappings
+
+    tasks = [(paths[i:i + chunk], i, array_path, imgsz) for i in range(0, len(paths), chunk)]
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    geometry = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, part in enumerate(pool.map(_decode_chunk, tasks), 1):
+            geometry.extend(part)
+            print(f"[CACHE] {min(done * chunk, len(paths))}/{len(paths)} images", end='\r')
+
+    names = [os.path.splitext(os.path.basename(p))[0] for p in paths]
+    box_offsets, boxes, classes = [0], [], []
+    failed = 0
+    for (class_ids, norm_boxes), geo in zip(labels.ground_truth([os.path.basename(p) for p in paths]), geometry):
+        if geo is None:
+            failed += 1
+        elif len(class_ids):
+            boxes.append(to_letterbox_pixels(norm_boxes, *geo))
+            classes.append(np.asarray(class_ids, dtype=np.int16))
+        box_offsets.append(box_offsets[-1] + (len(class_ids) if geo is not None else 0))
+
+    arrays = {
+        'names': np.asarray(names, dtype=str),
+        'box_offsets': np.asarray(box_offsets, dtype=np.int64),
+        'boxes': np.concatenate(boxes) if boxes else np.zeros((0, 4), np.float32),
+        'classes': np.concatenate(classes) if classes else np.zeros(0, np.int16),
+    }
+    for key, value in arrays.items():
+        np.save(os.path.join(tmp, key + '.npy'), value)
+    with open(os.path.join(INDEX_DIR, f'labels_{split}', 'meta.json'), encoding='utf-8') as f:
+        labels_newest = json.load(f)['newest_mtime_ns']
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': CACHE_VERSION, 'split': split, 'imgsz': imgsz, 'files': count,
+                   'newest_mtime_ns': newest, 'labels_mtime_ns': labels_newest,
+                   'images': len(paths), 'objects': int(box_offsets[-1]), 'failed': failed}, f)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    print(f"\n[CACHE] Cached {len(paths)} {split} images ({box_offsets[-1]} boxes, {failed} unreadable) "
+          f"in {time.perf_counter() - started:.1f}s -> {target}")
+    return target
+
+
+class ImageCache:
+    """
+    Read-only, memory-mapped view of one split's letterboxed images and pixel boxes.
+    """
+
+    def __init__(self, split, imgsz=DEFAULT_IMGSZ, auto_build=True):
+        self.split = split
+        self.imgsz = imgsz
+        if auto_build and is_stale(split, imgsz):
+            build_cache(split, imgsz)
+        directory = cache_dir(split, imgsz)
+        self.images = np.load(os.path.join(directory, 'images.npy'), mmap_mode='r')
+        for key in ('names', 'box_offsets', 'boxes', 'classes'):
+            setattr(self, key, np.load(os.path.join(directory, key + '.npy')))
+
+    def __len__(self):
+        return len(self.names)
+
+    def labels(self, i):
+        """
+        (classes, boxes) for image `i`.
+        """
+        lo, hi = self.box_offsets[i], self.box_offsets[i + 1]
+        return self.classes[lo:hi], self.boxes[lo:hi]
+
+
+def augment(image, classes, boxes, rng, hyp=DEFAULT_HYP):
+    """
+    Random scale/translate, HSV jitter and horizontal flip of a square letterboxed image.
+    Returns a new (image, classes, boxes); boxes pushed out of the frame are dropped.
+    """
+    size = image.shape[0]
+    s = rng.uniform(1 - hyp['scale'], 1 + hyp['scale'])
+    tx, ty = rng.uniform(-hyp['translate'], hyp['translate'], 2) * size
+    offset = (1 - s) * size / 2
+    matrix = np.array([[s, 0, offset + tx], [0, s, offset + ty]], dtype=np.float32)
+    image = cv2.warpAffine(image, matrix, (size, size), flags=cv2.INTER_LINEAR,
+                           borderValue=(PAD_VALUE, PAD_VALUE, PAD_VALUE))
+
+    if len(boxes):
+        moved = boxes * s + np.array([offset + tx, offset + ty] * 2, dtype=np.float32)
+        clipped = np.clip(moved, 0, size)
+        w, h = clipped[:, 2] - clipped[:, 0], clipped[:, 3] - clipped[:, 1]
+        area = (moved[:, 2] - moved[:, 0]) * (moved[:, 3] - moved[:, 1])
+        keep = (w > MIN_BOX_SIDE) & (h > MIN_BOX_SIDE) & (w * h > MIN_AREA_KEPT * np.maximum(area, 1e-6))
+        classes, boxes = classes[keep], clipped[keep]
+
+    if hyp['hsv_h'] or hyp['hsv_s'] or hyp['hsv_v']:
+        gains = rng.uniform(-1, 1, 3) * (hyp['hsv_h'], hyp['hsv_s'], hyp['hsv_v']) + 1
+        hue, sat, val = cv2.split(cv2.cvtColor(image, cv2.COLOR_BGR2HSV))
+        x = np.arange(256, dtype=np.float32)
+        luts = (((x * gains[0]) % 180).astype(np.uint8),
+                np.clip(x * gains[1], 0, 255).astype(np.uint8),
+                np.clip(x * gains[2], 0, 255).astype(np.uint8))
+        hsv = cv2.merge([cv2.LUT(c, lut) for c, lut in zip((hue, sat, val), luts)])
+        image = cv2.cvtColor(hsv, cv2.COLOR_HSV2BGR)
+
+    if rng.random() < hyp['fliplr']:
+        image = np.ascontiguousarray(image[:, ::-1])
+        if len(boxes):
+            boxes = np.stack([size - boxes[:, 2], boxes[:, 1], size - boxes[:, 0], boxes[:, 3]], axis=1)
+    return image, classes, boxes
+
+
+# Per-worker state, set once by the pool initializer
+_worker = {}
+
+
+def _init_worker(split, imgsz, hyp, from_cache):
+    _worker['hyp'] = hyp
+    _worker['imgsz'] = imgsz
+    if from_cache:
+        _worker['cache'] = ImageCache(split, imgsz, auto_build=False)
+    else:
+        _worker['paths'] = list_images(images_dir(split))
+        _worker['labels'] = LabelIndex(split, auto_rebuild=False)
+
+
+def _load_batch(task):
+    """
+    Worker: one augmented batch as ((B, imgsz, imgsz, 3) uint8, [(classes, boxes)] per image).
+    """
+    indices, seed = task
+    rng = np.random.default_rng(seed)
+    cache = _worker.get('cache')
+    images, labels = [], []
+    for i in indices:
+        if cache is not None:
+            image = cache.images[i]
+            classes, boxes = cache.labels(i)
+        else:
+            # Decode-every-epoch baseline: the work the cache removes
+            path = _worker['paths'][i]
+            frame = cv2.imread(path)
+            if frame is None:
+                frame = np.full((_worker['imgsz'], _worker['imgsz'], 3), PAD_VALUE, dtype=np.uint8)
+            image, ratio, pad = letterbox(frame, _worker['imgsz'])
+            class_ids, norm_boxes = _worker['labels'].ground_truth([os.path.basename(path)])[0]
+            classes, boxes = np.asarray(class_ids), to_letterbox_pixels(norm_boxes, frame.shape[:2], ratio, pad)
+        image, classes, boxes = augment(image, classes, boxes, rng, _worker['hyp'])
+        images.append(image)
+        labels.append((classes, boxes))
+    return np.stack(images), labels
+
+
+class AugmentedLoader:
+    """
+    Shuffled, augmented batches from a split, produced by a pool of worker processes.
+
+    Each worker maps the image cache once; a task is just a list of indices
+    and a seed, so only the finished batch crosses the process boundary.
+    With `from_cache=False` the workers decode the original files instead,
+    which is what the cache is measured against. At most `prefetch` batches
+    (default twice the workers) are in flight, so a slow consumer holds the
+    workers back rather than buffering the epoch.
+    """
+
+    def __init__(self, split='train', imgsz=DEFAULT_IMGSZ, batch_size=16, workers=None, hyp=None, seed=0,
+                 from_cache=True, limit=None, prefetch=None):
+        self.split = split
+        self.batch_size = batch_size
+        self.seed = seed
+        self.hyp = hyp or load_hyp()
+        if from_cache:
+            self.size = len(ImageCache(split, imgsz))  # Builds the cache if it is missing or stale
+        else:
+            self.size = len(list_images(images_dir(split)))
+        if limit:
+            self.size = min(self.size, limit)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.prefetch = prefetch or 2 * self.workers
+        self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                         initargs=(split, imgsz, self.hyp, from_cache))
+
+    def __len__(self):
+        return (self.size + self.batch_size - 1) // self.batch_size
+
+    def epoch(self, number=0):
+        """
+        Yield every batch of one epoch, in a per-epoch shuffled order.
+        """
+        rng = np.random.default_rng((self.seed, number))
+        order = rng.permutation(self.size)
+        tasks = ((order[i:i + self.batch_size], (self.seed, number, i))
+                 for i in range(0, self.size, self.batch_size))
+        pending = deque()
+        try:
+            for task in tasks:
+                pending.append(self._pool.submit(_load_batch, task))
+                if len(pending) >= self.prefetch:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:  # Consumer stopped early
+                future.cancel()
+
+    def close(self):
+        self._pool.shutdown()
+
+
+def bench(split='train', imgsz=DEFAULT_IMGSZ, epochs=3, batch_size=16, workers=None, compare_decode=False,
+          limit=None, output=None):
+    """
+    Epoch time and images/s of the cached loader (and optionally the decode-every-epoch baseline).
+    """
+    results = {'split': split, 'imgsz': imgsz, 'batch_size': batch_size, 'hyp': load_hyp(), 'runs': {}}
+    for name, from_cache in (('cache', True), ('decode', False)):
+        if name == 'decode' and not compare_decode:
+            continue
+        loader = AugmentedLoader(split, imgsz, batch_size, workers, seed=0, from_cache=from_cache, limit=limit)
+        results['workers'] = loader.workers
+        epoch_times = []
+        try:
+            for epoch in range(epochs):
+                started = time.perf_counter()
+                images = boxes = 0
+                for batch, labels in loader.epoch(epoch):
+                    images += len(batch)
+                    boxes += sum(len(b) for _, b in labels)
+                elapsed = time.perf_counter() - started
+                epoch_times.append(elapsed)
+                print(f"[DATA] {name:<6} epoch {epoch + 1}/{epochs}: {images} images, {boxes} boxes "
+                      f"in {elapsed:.1f}s ({images / elapsed:.1f} images/s)")
+        finally:
+            loader.close()
+        # The first epoch also pays for worker start-up and a cold page cache
+        steady = epoch_times[1:] or epoch_times
+        results['runs'][name] = {
+            'images': loader.size,
+            'epoch_s': epoch_times,
+            'images_per_s': loader.size / (sum(steady) / len(steady)),
+        }
+
+    runs = results['runs']
+    print(f"\n[DATA] {split} at {imgsz}, batch {batch_size}, {results['workers']} workers: "
+          f"cache {runs['cache']['images_per_s']:.1f} images/s", end='')
+    if 'decode' in runs:
+        speedup = runs['cache']['images_per_s'] / runs['decode']['images_per_s']
+        print(f", decoding every epoch {runs['decode']['images_per_s']:.1f} images/s ({speedup:.1f}x)")
+    else:
+        print()
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[DATA] Report written to {output}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="decode and letterbox one or more splits into the cache")
+    build.add_argument('--split', nargs='+', default=['train', 'valid'])
+    run = sub.add_parser('bench', help="augmented epochs over the cache, with throughput")
+    run.add_argument('--split', default='train')
+    run.add_argument('--epochs', type=int, default=3)
+    run.add_argument('--batch', type=int, default=16)
+    run.add_argument('--limit', type=int, help="only use the first N images")
+    run.add_argument('--compare-decode', action='store_true', help="also time decoding the JPEGs every epoch")
+    run.add_argument('--json', help="also write the report as JSON")
+    for p in (build, run):
+        p.add_argument('--imgsz', type=int, default=DEFAULT_IMGSZ)
+        p.add_argument('--workers', type=int)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for split in args.split:
+            build_cache(split, args.imgsz, args.workers)
+    else:
+        bench(args.split, args.imgsz, args.epochs, args.batch, args.workers, args.compare_decode,
+              args.limit, args.json)
+
+
+if __name__ == "__main__":
+    main()
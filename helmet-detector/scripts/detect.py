@@ -1,55 +1,90 @@
-from ultralytics import YOLO
-import cv2
 import os
 import time
-import serial  # Add this import for Arduino communication
-import numpy as np
+
+# Only lightweight modules at import time: OpenCV, NumPy, pyserial and Ultralytics/torch are
+# imported where they are first needed, so usage errors and bad paths are reported instantly
+from arduino_link import DEFAULT_PORT, ArduinoLink, get_arduino_link
+from helmet_detector import BACKENDS, MODEL_PATH, CLASS_NAMES, get_detector, model_path_for
+from evidence import EVIDENCE_DIR, SAVE_POLICIES, EvidenceWriter
+from profiling import NULL_PROFILER, StageProfiler, StartupTimer
+from result_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES, ResultCache, content_hash
+from telemetry import EVENT_LOG_PATH, METRICS_PORT, EventLog, Telemetry
 
 # Get the directory of the current script to build absolute paths
 script_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Path to the custom-trained helmet detection model
-MODEL_PATH = os.path.join(script_dir, '..', 'models', 'best.pt')
-
-# The model has 2 classes: 'With Helmet', 'Without Helmet'.
-# CORRECTED MAPPING based on data.yaml:
-CLASS_NAMES = {0: 'With Helmet', 1: 'Without Helmet'}
-
-def classify_helmet_usage(image_path):
+def classify_helmet_usage(image_path, detector=None, arduino=None, profiler=NULL_PROFILER, cache=None,
+                          evidence=None, telemetry=None, tiler=None):
     """
     Analyzes an image to determine helmet usage.
+    Pass a HelmetDetector / ArduinoLink to reuse an already-loaded model or open port,
+    a StageProfiler to record per-stage timings, a ResultCache to skip decoding
+    and inference for images that were already scored, an EvidenceWriter to
+    save the annotated frame according to its policy, a Telemetry to log the decision
+    and a TiledFallback to re-check images without a confident detection tile by tile.
     """
     if not os.path.exists(image_path):
         print(f"Error: Image not found at {image_path}")
         return
 
-    # Load the custom YOLOv8 model
+    import cv2
+    import numpy as np
+    from verdict import CONFIDENCE_THRESHOLD, HELMET_CLASS, NO_HELMET_CLASS, summarize_detections
+
+    # Reuse the shared YOLOv8 model (loaded and warmed up once per process)
     try:
-        model = YOLO(MODEL_PATH)
+        if detector is None:
+            detector = get_detector()
     except Exception as e:
         print(f"Error loading model from {MODEL_PATH}. Make sure the file exists.")
         print(f"Details: {e}")
         return
 
-    # Read the image
-    img = cv2.imread(image_path)
-    if img is None:
-        print(f"Error: Could not read image from {image_path}")
-        return
+    # Read the image (with a cache, only its bytes until we know it is a miss)
+    decision_start = time.perf_counter()
+    img = None
+    cached = None
+    with profiler.stage('capture'):
+        if cache is not None:
+            with open(image_path, 'rb') as f:
+                data = f.read()
+            cache_key = cache.key(content_hash(data))
+            cached = cache.get(cache_key)
+            if cached is None:
+                img = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        else:
+            img = cv2.imread(image_path)
 
-    # Convert BGR to RGB before inference
-    img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
+    if cached is not None:
+        print(f"[CACHE] Reusing stored result for {os.path.basename(image_path)}")
+        with profiler.stage('postprocess'):
+            summary = summarize_detections(cached[0], CONFIDENCE_THRESHOLD)
+            detections = summary['rows'].tolist()
+    else:
+        if img is None:
+            print(f"Error: Could not read image from {image_path}")
+            return
 
-    # Perform inference
-    results = model(img_rgb)
+        # Perform inference; Ultralytics takes the BGR array as decoded and does its own
+        # resize, colour conversion and normalisation
+        with profiler.stage('infer'):
+            rows = detector.detect(img).boxes.data
+            if tiler is not None:
+                rows, tiled = tiler.refine(detector, img, rows, CONFIDENCE_THRESHOLD)
+                if tiled:
+                    print("[TILES] No confident detection on the whole image - re-checked tile by tile")
 
-    # Process the results
-    detections = results[0].boxes.data
+        # Process the results: one copy to NumPy, flags computed with array operations
+        with profiler.stage('postprocess'):
+            summary = summarize_detections(rows, CONFIDENCE_THRESHOLD)
+            detections = summary['rows'].tolist()
+        if cache is not None:
+            cache.put(cache_key, summary['rows'], summary['verdict'])
     
     # Flags to check detection status
-    helmet_detected = False
-    no_helmet_detected = False
-    total_detections = len(detections)
+    helmet_detected = bool(summary['counts'][HELMET_CLASS])
+    no_helmet_detected = bool(summary['counts'][NO_HELMET_CLASS])
+    total_detections = summary['num_detections']
 
     print("\n" + "="*60)
     print("HELMET DETECTION TEST RESULTS")
@@ -58,27 +93,20 @@ def classify_helmet_usage(image_path):
     
     # Show ALL detections first (for debugging)
     print("\n--- ALL DETECTIONS (including low confidence) ---")
-    for i, det in enumerate(detections):
-        x1, y1, x2, y2, confidence, class_id = det
-        class_id = int(class_id)
-        class_name = CLASS_NAMES.get(class_id, 'unknown')
+    for i, (x1, y1, x2, y2, confidence, class_id) in enumerate(detections):
+        class_name = CLASS_NAMES.get(int(class_id), 'unknown')
         print(f"Detection {i+1}: {class_name} (confidence: {confidence:.3f})")
     
-    print("\n--- HIGH CONFIDENCE DETECTIONS (>0.5) ---")
-    # Process detections
-    for det in detections:
-        # det is a tensor like [x1, y1, x2, y2, confidence, class_id]
-        x1, y1, x2, y2, confidence, class_id = det
-        class_id = int(class_id)
-        class_name = CLASS_NAMES.get(class_id, 'unknown')
+    print(f"\n--- HIGH CONFIDENCE DETECTIONS (>{CONFIDENCE_THRESHOLD}) ---")
+    # Report detections (the verdict flags were already computed on the array)
+    for x1, y1, x2, y2, confidence, class_id in detections:
+        class_name = CLASS_NAMES.get(int(class_id), 'unknown')
         
         # Only consider detections with confidence > 0.5
-        if confidence > 0.5:
+        if confidence > CONFIDENCE_THRESHOLD:
             if class_name == 'With Helmet':
-                helmet_detected = True
                 print(f"🟢 With Helmet detected (confidence: {confidence:.2f})")
             elif class_name == 'Without Helmet':
-                no_helmet_detected = True
                 print(f"🔴 Without Helmet detected (confidence: {confidence:.2f})")
             else:
                 print(f"❓ Unknown object detected (confidence: {confidence:.2f})")
@@ -111,16 +139,10 @@ def classify_helmet_usage(image_path):
 
     print(f"Result for {os.path.basename(image_path)}: {output_message}")
     
-    # Initialize serial connection to Arduino
-    # Change 'COM3' to your Arduino's port if needed (see Device Manager or Arduino IDE)
-    try:
-        arduino = serial.Serial('COM3', 9600, timeout=1)
-        time.sleep(2)  # Wait for Arduino to reset
-        arduino_connected = True
-        print("✅ Arduino connected successfully!")
-    except Exception as e:
-        print(f"Warning: Could not connect to Arduino on COM3.\nDetails: {e}\nProceeding without Arduino integration.")
-        arduino_connected = False
+    # Reuse the persistent Arduino link (the port is opened once per process)
+    if arduino is None:
+        arduino = get_arduino_link()
+    arduino_connected = arduino.connected
 
     # Determine final helmet status and send to Arduino
     print("\n" + "-"*60)
@@ -166,75 +188,42 @@ def classify_helmet_usage(image_path):
         result_summary = "FAIL"
         arduino_signal = b'0'  # Treat as fail for safety
 
-    # Send result to Arduino if connected
+    # Send result to Arduino if connected; the background writer does the serial I/O
     if arduino_connected:
-        try:
-            print(f"[ARDUINO] Sending signal: {arduino_signal.decode()} (1=PASS, 0=FAIL)")
-            arduino.write(arduino_signal)
-            print("[ARDUINO] Signal sent successfully")
-            
-            # Wait longer and check for Arduino response
-            time.sleep(2)  # Give Arduino more time to process
-            
-            # Try to read Arduino response
-            if arduino.in_waiting:
-                response = arduino.readline().decode().strip()
-                print(f"[ARDUINO] Response: {response}")
-            else:
-                print("[ARDUINO] No response from Arduino")
-                
-            # Keep connection open a bit longer for buzzer to complete
-            time.sleep(1)
-            
-        except Exception as e:
-            print(f"[ARDUINO] Error sending signal: {e}")
-        finally:
-            arduino.close()
-            print("[ARDUINO] Connection closed")
+        with profiler.stage('actuate'):
+            arduino.send(arduino_signal)
     else:
         print("[ARDUINO] No Arduino connection - skipping hardware control")
+    profiler.record('total', time.perf_counter() - decision_start)
+    if telemetry is not None:
+        telemetry.decision(image_path, summary['verdict'], summary['max_conf'], CONFIDENCE_THRESHOLD,
+                           cached=cached is not None)
 
-    # === Save result frame with bounding boxes and labels ===
-    save_choice = input("Do you want to save the test frame? (y/n): ").lower().strip()
-    if save_choice in ['y', 'yes']:
-        result_frame = img.copy()
-        for det in detections:
-            x1, y1, x2, y2, confidence, class_id = det
-            class_id = int(class_id)
-            class_name = CLASS_NAMES.get(class_id, 'unknown')
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            if class_name == 'With Helmet':
-                color = (0, 255, 0)
-            elif class_name == 'Without Helmet':
-                color = (0, 0, 255)
-            else:
-                color = (128, 128, 128)
-            cv2.rectangle(result_frame, (x1, y1), (x2, y2), color, 2)
-            label = f"{class_name}: {confidence:.2f}"
-            cv2.putText(result_frame, label, (x1, y1-10), cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        cv2.putText(result_frame, status, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
-        cv2.putText(result_frame, f"Result: {result_summary}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"helmet_test_{result_summary}_{timestamp}.jpg"
-        save_path = os.path.join(script_dir, '..', 'input', filename)
-        try:
-            cv2.imwrite(save_path, result_frame)
-            print(f"✅ Test frame saved as: {filename}")
-            print(f"📁 Location: {save_path}")
-        except Exception as e:
-            print(f"❌ Error saving frame: {e}")
-    else:
-        print("Test frame not saved.")
+    # Evidence is drawn, encoded and written on a background thread, never on the decision path
+    if evidence is not None and evidence.submit(img if img is not None else image_path, detections,
+                                                result_summary, status):
+        print(f"📁 Test frame queued for saving in {evidence.directory}")
     return output_message
 
-def live_helmet_detection():
+def live_helmet_detection(detector=None, arduino=None, profiler=NULL_PROFILER, evidence=None, preprocessor=None,
+                          telemetry=None, tiler=None):
     """
     Automatic helmet detection using webcam - no GUI, automatic capture.
-    Now sends result to Arduino Uno via serial (COM3 by default).
+    Now sends result to Arduino Uno via serial (COM3 by default, see --arduino-port).
+    Pass a HelmetDetector / ArduinoLink to reuse an already-loaded model or open port,
+    a StageProfiler to record per-stage timings, an EvidenceWriter to save the scored frame,
+    a Telemetry to log the decision and a TiledFallback for riders too far away for the whole frame.
     """
-    # Load the custom YOLOv8 model
+    import cv2
+    from preprocess import confidence_for, frame_quality, get_preprocessor, quality_score
+    from verdict import HELMET_CLASS, NO_HELMET_CLASS, summarize_detections
+
+    if preprocessor is None:
+        preprocessor = get_preprocessor()
+    # Reuse the shared YOLOv8 model (loaded and warmed up once per process)
     try:
-        model = YOLO(MODEL_PATH)
+        if detector is None:
+            detector = get_detector()
         print("Model loaded successfully!")
     except Exception as e:
         print(f"Error loading model from {MODEL_PATH}. Make sure the file exists.")
@@ -277,28 +266,18 @@ def live_helmet_detection():
     
     print(f"Camera initialized successfully. Frame size: {test_frame.shape}")
     
-    # Enhanced image quality analysis
-    mean_brightness = test_frame.mean()
-    gray_test = cv2.cvtColor(test_frame, cv2.COLOR_BGR2GRAY)
-    contrast = gray_test.std()
-    blur_level = cv2.Laplacian(gray_test, cv2.CV_64F).var()
+    # Image quality analysis on a downscaled grayscale view
+    mean_brightness, contrast, blur_level = frame_quality(test_frame)
     
     print(f"Image brightness: {mean_brightness:.1f}")
     print(f"Image contrast: {contrast:.1f}")
     print(f"Blur level: {blur_level:.1f}")
     
     # Determine optimal detection parameters based on image quality
-    if mean_brightness < 60:
-        confidence_threshold = 0.3  # Lower threshold for dark images
-        print("⚠️ WARNING: Image appears too dark - using lower confidence threshold")
-    elif mean_brightness < 100:
-        confidence_threshold = 0.4  # Lower threshold for low light
-        print("⚠️ WARNING: Image appears dim - using lower confidence threshold")
-    elif blur_level < 100:
-        confidence_threshold = 0.4  # Lower threshold for blurry images
-        print("⚠️ WARNING: Image appears blurry - using lower confidence threshold")
+    confidence_threshold, quality_issue = confidence_for(mean_brightness, blur_level)
+    if quality_issue:
+        print(f"⚠️ WARNING: Image appears {quality_issue} - using lower confidence threshold")
     else:
-        confidence_threshold = 0.5  # Standard threshold for good conditions
         print("✅ Image quality looks good")
 
     print("Automatic helmet detection starting...")
@@ -328,6 +307,7 @@ def live_helmet_detection():
 
     # Capture multiple frames and select the best one
     print("Capturing frame now...")
+    decision_start = time.perf_counter()
     best_frame = None
     best_quality = 0
     
@@ -338,23 +318,19 @@ def live_helmet_detection():
             print(f"Error: Could not read frame {attempt + 1}")
             continue
             
-        # Calculate frame quality
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        frame_brightness = gray_frame.mean()
-        frame_contrast = gray_frame.std()
-        frame_blur = cv2.Laplacian(gray_frame, cv2.CV_64F).var()
-        
-        # Quality score (higher is better)
-        quality_score = frame_contrast + frame_blur * 0.1  # Prioritize contrast and sharpness
+        # Calculate frame quality (higher is better); read() returns a new array, so no copy is needed
+        _, frame_contrast, frame_blur = frame_quality(frame)
+        score = quality_score(frame_contrast, frame_blur)
         
-        if quality_score > best_quality:
-            best_quality = quality_score
-            best_frame = frame.copy()
-            print(f"Frame {attempt + 1}: Quality score {quality_score:.1f} (selected)")
+        if score > best_quality:
+            best_quality = score
+            best_frame = frame
+            print(f"Frame {attempt + 1}: Quality score {score:.1f} (selected)")
         else:
-            print(f"Frame {attempt + 1}: Quality score {quality_score:.1f}")
+            print(f"Frame {attempt + 1}: Quality score {score:.1f}")
     
     cap.release()
+    profiler.record('capture', time.perf_counter() - decision_start)
     
     if best_frame is None:
         print("Error: Could not capture any valid frame")
@@ -363,42 +339,38 @@ def live_helmet_detection():
     print(f"Selected frame with quality score: {best_quality:.1f}")
     print("Processing captured frame...")
     
-    # Enhanced preprocessing for better detection
-    processed_frame = best_frame.copy()
-    
-    # Apply adaptive preprocessing based on image quality
-    if mean_brightness < 100:  # Low light condition
-        # Enhance brightness and contrast
-        lab = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2LAB)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        lab[:, :, 0] = clahe.apply(lab[:, :, 0])
-        processed_frame = cv2.cvtColor(lab, cv2.COLOR_LAB2BGR)
-        processed_frame = cv2.convertScaleAbs(processed_frame, alpha=1.2, beta=20)
+    # Adaptive preprocessing based on image quality: one pass, persistent CLAHE/kernel,
+    # at most one new full-resolution frame. Ultralytics takes BGR arrays, so no RGB conversion.
+    preprocess_start = time.perf_counter()
+    low_light, blurry = preprocessor.needs(mean_brightness, blur_level)
+    processed_frame = preprocessor.enhance(best_frame, low_light, blurry)
+    profiler.record('preprocess', time.perf_counter() - preprocess_start)
+    if low_light:
         print("Applied brightness and contrast enhancement")
-    
-    if blur_level < 150:  # Blurry condition
-        # Apply sharpening
-        kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-        processed_frame = cv2.filter2D(processed_frame, -1, kernel)
+    if blurry:
         print("Applied image sharpening")
-    
-    # Convert BGR to RGB before inference
-    processed_frame_rgb = cv2.cvtColor(processed_frame, cv2.COLOR_BGR2RGB)
-    results = model(processed_frame_rgb)
+
+    with profiler.stage('infer'):
+        result = detector.detect(processed_frame)
+        rows = result.boxes.data
+        if tiler is not None:
+            rows, tiled = tiler.refine(detector, processed_frame, rows, confidence_threshold)
+            if tiled:
+                print(f"[TILES] No confident detection on the whole frame - tiled pass found {len(rows)}")
     
     # Debug: Print raw results
-    print(f"Model returned {len(results)} result(s)")
-    if len(results) > 0:
-        print(f"First result has {len(results[0].boxes)} detections")
-        print(f"Detection data shape: {results[0].boxes.data.shape if hasattr(results[0].boxes, 'data') else 'No data'}")
+    print(f"Result has {len(result.boxes)} detections")
+    print(f"Detection data shape: {result.boxes.data.shape if hasattr(result.boxes, 'data') else 'No data'}")
     
-    # Process the results
-    detections = results[0].boxes.data
+    # Process the results: one copy to NumPy, flags computed with array operations
+    with profiler.stage('postprocess'):
+        summary = summarize_detections(rows, confidence_threshold)
+        detections = summary['rows'].tolist()
     
     # Flags to check detection status
-    helmet_detected = False
-    no_helmet_detected = False
-    total_detections = len(detections)
+    helmet_detected = bool(summary['counts'][HELMET_CLASS])
+    no_helmet_detected = bool(summary['counts'][NO_HELMET_CLASS])
+    total_detections = summary['num_detections']
 
     print("\n" + "="*60)
     print("HELMET DETECTION TEST RESULTS")
@@ -407,27 +379,20 @@ def live_helmet_detection():
     
     # Show ALL detections first (for debugging)
     print("\n--- ALL DETECTIONS (including low confidence) ---")
-    for i, det in enumerate(detections):
-        x1, y1, x2, y2, confidence, class_id = det
-        class_id = int(class_id)
-        class_name = CLASS_NAMES.get(class_id, 'unknown')
+    for i, (x1, y1, x2, y2, confidence, class_id) in enumerate(detections):
+        class_name = CLASS_NAMES.get(int(class_id), 'unknown')
         print(f"Detection {i+1}: {class_name} (confidence: {confidence:.3f})")
     
     print(f"\n--- HIGH CONFIDENCE DETECTIONS (>{confidence_threshold:.1f}) ---")
-    # Process detections with adaptive threshold
-    for det in detections:
-        # det is a tensor like [x1, y1, x2, y2, confidence, class_id]
-        x1, y1, x2, y2, confidence, class_id = det
-        class_id = int(class_id)
-        class_name = CLASS_NAMES.get(class_id, 'unknown')
+    # Report detections (the verdict flags were already computed on the array)
+    for x1, y1, x2, y2, confidence, class_id in detections:
+        class_name = CLASS_NAMES.get(int(class_id), 'unknown')
         
         # Use adaptive confidence threshold based on image quality
         if confidence > confidence_threshold:
             if class_name == 'With Helmet':
-                helmet_detected = True
                 print(f"🟢 With Helmet detected (confidence: {confidence:.2f})")
             elif class_name == 'Without Helmet':
-                no_helmet_detected = True
                 print(f"🔴 Without Helmet detected (confidence: {confidence:.2f})")
             else:
                 print(f"❓ Unknown object detected (confidence: {confidence:.2f})")
@@ -442,15 +407,10 @@ def live_helmet_detection():
         print("   • The model needs better training data")
         print("   • Try adjusting lighting or position")
 
-    # Initialize serial connection to Arduino
-    # Change 'COM3' to your Arduino's port if needed (see Device Manager or Arduino IDE)
-    try:
-        arduino = serial.Serial('COM3', 9600, timeout=1)
-        time.sleep(2)  # Wait for Arduino to reset
-        arduino_connected = True
-    except Exception as e:
-        print(f"Warning: Could not connect to Arduino on COM3.\nDetails: {e}\nProceeding without Arduino integration.")
-        arduino_connected = False
+    # Reuse the persistent Arduino link (the port is opened once per process)
+    if arduino is None:
+        arduino = get_arduino_link()
+    arduino_connected = arduino.connected
 
     # Determine and display final helmet status
     print("\n" + "-"*60)
@@ -496,80 +456,319 @@ def live_helmet_detection():
         result_summary = "FAIL"
         arduino_signal = b'0'  # Treat as fail for safety
 
-    # Send result to Arduino if connected
+    # Send result to Arduino if connected; the background writer does the serial I/O
     if arduino_connected:
-        try:
-            arduino.write(arduino_signal)
-            print(f"[ARDUINO] Sent signal: {arduino_signal.decode()} (1=PASS, 0=FAIL)")
-        except Exception as e:
-            print(f"[ARDUINO] Error sending signal: {e}")
+        with profiler.stage('actuate'):
+            arduino.send(arduino_signal)
+    profiler.record('total', time.perf_counter() - decision_start)
+    if telemetry is not None:
+        telemetry.decision('webcam', summary['verdict'], summary['max_conf'], confidence_threshold,
+                           quality={'brightness': mean_brightness, 'contrast': contrast, 'blur': blur_level,
+                                    'selected_score': best_quality},
+                           enhanced={'low_light': bool(low_light), 'sharpened': bool(blurry)})
 
-    # Ask if user wants to save the test frame
-    print("\n" + "="*60)
-    save_choice = input("Do you want to save the test frame? (y/n): ").lower().strip()
-    
-    if save_choice in ['y', 'yes']:
-        # Create a copy of frame for drawing results
-        result_frame = frame.copy()
-        
-        # Draw detection results on frame
-        for det in detections:
-            x1, y1, x2, y2, confidence, class_id = det
-            class_id = int(class_id)
-            class_name = CLASS_NAMES.get(class_id, 'unknown')
-            
-            # Convert coordinates to integers
-            x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
-            
-            if class_name == 'With Helmet':
-                color = (0, 255, 0)  # Green
-            elif class_name == 'Without Helmet':
-                color = (0, 0, 255)  # Red
-            else:
-                color = (128, 128, 128)  # Gray
-            
-            # Draw bounding box
-            cv2.rectangle(result_frame, (x1, y1), (x2, y2), color, 2)
-            
-            # Add label
-            label = f"{class_name}: {confidence:.2f}"
-            cv2.putText(result_frame, label, (x1, y1-10), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
-        
-        # Add final result to frame
-        cv2.putText(result_frame, status, (50, 50), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
-        cv2.putText(result_frame, f"Result: {result_summary}", (50, 100), 
-                   cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
-        
-        # Save the frame
-        timestamp = time.strftime("%Y%m%d_%H%M%S")
-        filename = f"helmet_test_{result_summary}_{timestamp}.jpg"
-        save_path = os.path.join(script_dir, '..', 'input', filename)
-        
-        try:
-            cv2.imwrite(save_path, result_frame)
-            print(f"✅ Test frame saved as: {filename}")
-            print(f"📁 Location: {save_path}")
-        except Exception as e:
-            print(f"❌ Error saving frame: {e}")
-    else:
-        print("Test frame not saved.")
+    # Save the frame that was scored (not the last capture) on the background writer
+    if evidence is not None and evidence.submit(best_frame, detections, result_summary, status):
+        print(f"📁 Test frame queued for saving in {evidence.directory}")
 
     print("\n" + "="*60)
     print("Test completed!")
     print("="*60)
 
+
+def remote_helmet_detection(image_path, server, arduino=None, profiler=NULL_PROFILER, camera=None, timeout=30.0):
+    """
+    Score an image on an already-running `detect.py --serve` instance, whose model is
+    loaded and warm, and drive the local Arduino with the answer. Only the standard
+    library is used on this side, so the client starts in a fraction of a second.
+    Returns the verdict, or None when the server could not be reached.
+    """
+    import json
+    import urllib.request
+
+    if not os.path.exists(image_path):
+        print(f"Error: Image not found at {image_path}")
+        return None
+
+    decision_start = time.perf_counter()
+    with open(image_path, 'rb') as f:
+        data = f.read()
+    headers = {'Content-Type': 'application/octet-stream'}
+    if camera:
+        headers['X-Camera'] = camera
+    request = urllib.request.Request(server.rstrip('/') + '/detect', data=data, headers=headers)
+    try:
+        with profiler.stage('infer'):
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                result = json.loads(response.read())
+    except Exception as e:
+        print(f"Error: Could not reach the detection server at {server}.\nDetails: {e}")
+        return None
+
+    verdict = result['verdict']
+    print(f"Result for {os.path.basename(image_path)}: {verdict} "
+          f"({result['num_detections']} detections, {result.get('server_ms', 0):.1f} ms on the server)")
+    if arduino is not None and arduino.connected:
+        with profiler.stage('actuate'):
+            arduino.send_verdict(verdict)
+    profiler.record('total', time.perf_counter() - decision_start)
+    return verdict
+
+
 if __name__ == "__main__":
+    import argparse
     import sys
-    if len(sys.argv) < 2:
+
+    parser = argparse.ArgumentParser(description="Helmet detection for images, webcam and video streams")
+    parser.add_argument('images', nargs='*', help="image file(s) to check")
+    parser.add_argument('--webcam', action='store_true', help="single countdown capture from the webcam")
+    parser.add_argument('--stream', nargs='?', const='0', metavar='SOURCE',
+                        help="continuous detection on a camera index, video file/URL or image directory (default: camera 0)")
+    parser.add_argument('--batch', metavar='DIR_OR_GLOB', help="score every image in a directory or glob pattern")
+    parser.add_argument('--multi', nargs='+', metavar='CONFIG_OR_SOURCE',
+                        help="several cameras with one shared model: a cameras .json config, "
+                             "or camera indices / RTSP URLs / video files")
+    parser.add_argument('--queue-size', type=int, default=2, help="frames buffered per source for --multi")
+    parser.add_argument('--serve', nargs='?', const=8765, type=int, metavar='PORT',
+                        help="serve POST /detect over HTTP with one resident model (default port: %(const)s)")
+    parser.add_argument('--host', default='127.0.0.1', help="bind address for --serve")
+    parser.add_argument('--server', metavar='URL',
+                        help="score the images on a running --serve instance (model already warm) "
+                             "instead of loading the model here, e.g. http://127.0.0.1:8765")
+    parser.add_argument('--camera-name', help="name sent with --server requests (shown in its event log)")
+    parser.add_argument('--max-batch', type=int, default=8, help="largest batch formed by --serve and --multi")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0,
+                        help="how long --serve waits for more requests before running a partial batch")
+    parser.add_argument('--batch-size', type=int, default=16, help="images per model call for --batch")
+    parser.add_argument('--workers', type=int, help="decode worker processes for --batch")
+    parser.add_argument('--output', default='batch_results.csv', help="CSV or JSONL results file for --batch")
+    parser.add_argument('--backend', choices=BACKENDS, default='torch',
+                        help="inference backend; onnx/openvino need an export from scripts/export_model.py")
+    parser.add_argument('--int8', action='store_true', help="use the INT8-quantized onnx/openvino export")
+    parser.add_argument('--imgsz', type=int,
+                        help="inference size in pixels (default: 640); see 'evaluate.py tune-imgsz' for the smallest safe size")
+    parser.add_argument('--tiles', action='store_true',
+                        help="re-check images / --webcam / --stream frames without a confident detection in overlapping tiles")
+    parser.add_argument('--tile-size', type=int, help="tile side in pixels for --tiles (default: 320)")
+    parser.add_argument('--tile-overlap', type=float, help="fraction of overlap between tiles (default: 0.2)")
+    parser.add_argument('--arduino-port', default=DEFAULT_PORT,
+                        help="serial port of the Arduino, e.g. COM3, /dev/ttyACM0 or loop:// (default: %(default)s)")
+    parser.add_argument('--no-arduino', action='store_true', help="run without opening the serial port")
+    parser.add_argument('--threshold', type=float, default=0.5, help="confidence threshold for --stream, --track and --batch")
+    parser.add_argument('--max-frames', type=int, help="stop --stream after this many processed frames")
+    parser.add_argument('--duration', type=float, help="stop --stream / --track after this many seconds")
+    parser.add_argument('--track', action='store_true',
+                        help="with --stream: run the model every --detect-every frames and track riders in between")
+    parser.add_argument('--detect-every', type=int, default=5, help="model interval in frames for --track")
+    parser.add_argument('--motion-gate', nargs='?', const='diff', choices=['diff', 'mog2'],
+                        help="only run the model on frames with motion in the ROI (frame differencing or MOG2)")
+    parser.add_argument('--roi', help="region of interest x,y,w,h in pixels or fractions, e.g. 0.25,0.1,0.5,0.8")
+    parser.add_argument('--no-smoothing', action='store_true',
+                        help="act on every per-frame verdict in --stream instead of the debounced state")
+    parser.add_argument('--profile', nargs='?', const='profile.json', metavar='JSON_PATH',
+                        help="print p50/p95/p99 stage timings at exit and dump them as JSON (default: %(const)s)")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, metavar='SQLITE_PATH',
+                        help="reuse stored results for byte-identical images (images and --batch; default: %(const)s)")
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_MAX_ENTRIES,
+                        help="maximum cached results before least-recently-used ones are evicted")
+    parser.add_argument('--save', choices=SAVE_POLICIES, default='none',
+                        help="save annotated decision frames: none, fail (non-PASS), every (every --save-every-th) or all")
+    parser.add_argument('--save-every', type=int, default=10, help="decision interval for --save every")
+    parser.add_argument('--save-dir', default=EVIDENCE_DIR, help="directory for saved frames (default: %(default)s)")
+    parser.add_argument('--jpeg-quality', type=int, default=90, help="JPEG quality of saved frames")
+    parser.add_argument('--save-max-mb', type=float,
+                        help="delete the oldest saved frames once --save-dir holds more than this many MB")
+    parser.add_argument('--log-events', nargs='?', const=EVENT_LOG_PATH, metavar='JSONL_PATH',
+                        help="append one JSON line per decision, rotated by size (default: %(const)s)")
+    parser.add_argument('--log-max-mb', type=float, default=50, help="rotate the event log at this size")
+    parser.add_argument('--log-backups', type=int, default=5, help="rotated event logs to keep")
+    parser.add_argument('--metrics-port', nargs='?', const=METRICS_PORT, type=int, metavar='PORT',
+                        help="serve Prometheus metrics on GET /metrics (default port: %(const)s)")
+    parser.add_argument('--metrics-host', default='0.0.0.0', help="bind address for --metrics-port")
+    parser.add_argument('--no-realtime', action='store_true',
+                        help="read video files / image directories as fast as possible instead of at their frame rate")
+    args = parser.parse_args()
+    startup = StartupTimer()
+
+    if not (args.images or args.webcam or args.stream is not None or args.batch or args.serve or args.multi):
         print("Usage:")
-        print("  For image detection: python detect.py <path_to_image>")
+        print("  For image detection: python detect.py <path_to_image> [<path_to_image> ...]")
         print("  For live webcam detection: python detect.py --webcam")
+        print("  For continuous streaming: python detect.py --stream [camera_index|video_file|image_dir]")
+        print("  For batch scoring: python detect.py --batch <dir|glob> [--output results.jsonl]")
+        print("  For several cameras: python detect.py --multi cameras.json | --multi 0 1 rtsp://...")
+        print("  For a shared HTTP service: python detect.py --serve [port] [--max-batch 8 --max-wait-ms 5]")
+        print("  Against a running service: python detect.py --server http://127.0.0.1:8765 <path_to_image>")
         sys.exit(1)
-    
-    if sys.argv[1] == "--webcam":
-        live_helmet_detection()
+
+    if args.server and (args.webcam or args.stream is not None or args.batch or args.serve or args.multi):
+        parser.error("--server only scores image paths")
+    if args.track and args.tiles:
+        parser.error("--tiles is not supported with --track")
+
+    # Reject bad image paths before paying for the model
+    if args.images and not (args.webcam or args.stream is not None or args.batch or args.serve or args.multi):
+        missing = [p for p in args.images if not os.path.exists(p)]
+        for path in missing:
+            print(f"Error: Image not found at {path}")
+        args.images = [p for p in args.images if p not in missing]
+        if not args.images:
+            sys.exit(1)
+
+    try:
+        model_path = model_path_for(args.backend, args.int8)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not args.server and not os.path.exists(model_path):
+        # Checked up front: the result cache hashes the weights before the model has loaded
+        print(f"Error loading {args.backend} model. Make sure the file exists "
+              f"(export it with scripts/export_model.py for onnx/openvino).")
+        print(f"Details: model not found at {model_path}")
+        sys.exit(1)
+
+    # Load (and warm up) the model once for the whole run, on a background thread so the
+    # serial port (which waits for the board to reset), cache and writers open meanwhile.
+    # With --server the model lives in the already-running service instead.
+    detector_future = None
+    if not args.server:
+        from concurrent.futures import ThreadPoolExecutor
+        loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+        detector_future = loader.submit(get_detector, model_path, imgsz=args.imgsz)
+        loader.shutdown(wait=False)
+
+    # Per-stage timings are always collected (they also time startup); --profile prints them at exit
+    profiler = StageProfiler(startup=startup)
+    if args.profile:
+        import atexit
+
+        def _dump_profile():
+            profiler.print_report()
+            profiler.dump_json(args.profile)
+        atexit.register(_dump_profile)
+
+    telemetry = None
+    if args.log_events or args.metrics_port:
+        import atexit
+        event_log = None
+        if args.log_events:
+            event_log = EventLog(args.log_events, max_bytes=int(args.log_max_mb * 1024 * 1024),
+                                 backups=args.log_backups).start()
+        telemetry = Telemetry(event_log, profiler)
+        if args.metrics_port:
+            telemetry.serve_metrics(args.metrics_host, args.metrics_port)
+        atexit.register(telemetry.close)
+
+    tiler = None
+    if args.tiles:
+        from tiling import TILE_OVERLAP, TILE_SIZE, TiledFallback
+        tiler = TiledFallback(args.tile_size or TILE_SIZE,
+                              args.tile_overlap if args.tile_overlap is not None else TILE_OVERLAP)
+
+    cache = None
+    if args.cache and (args.batch or args.images) and not args.server:
+        # Batch results are computed on downscaled images, so they are cached separately
+        from batch import MAX_SIDE
+        from verdict import CONFIDENCE_THRESHOLD
+        preprocess = f'max_side={MAX_SIDE}' if args.batch else 'full'
+        if args.imgsz:
+            preprocess += f',imgsz={args.imgsz}'
+        if tiler is not None and not args.batch:
+            preprocess += f',tiles={tiler.tile}/{tiler.overlap:g}'
+        cache = ResultCache(args.cache, model_path=model_path,
+                            threshold=args.threshold if args.batch else CONFIDENCE_THRESHOLD,
+                            max_entries=args.cache_size, preprocess=preprocess)
+        if not args.batch:
+            import atexit
+            atexit.register(cache.print_stats)
+
+    evidence = None
+    if args.save != 'none':
+        import atexit
+        evidence = EvidenceWriter(args.save_dir, policy=args.save, every=args.save_every, quality=args.jpeg_quality,
+                                  max_bytes=int(args.save_max_mb * 1024 * 1024) if args.save_max_mb else None,
+                                  profiler=profiler).start()
+
+        def _close_evidence():
+            evidence.close()
+            s = evidence.stats()
+            print(f"[SAVE] {s['saved']} frames saved to {args.save_dir} ({s['dropped']} dropped, "
+                  f"{s['evicted']} evicted for the size cap)")
+        atexit.register(_close_evidence)
+
+    if telemetry is not None:
+        telemetry.watch('cache', cache)
+        telemetry.watch('evidence', evidence)
+
+    # One persistent link for the whole run; --batch and --serve never drive the hardware,
+    # --multi opens one link per source from its config
+    arduino = None
+    if not (args.batch or args.serve or args.multi):
+        arduino = ArduinoLink(args.arduino_port) if args.no_arduino else get_arduino_link(args.arduino_port)
+
+    gate = None
+    if args.motion_gate or args.roi:
+        from motion_gate import MotionGate, parse_roi
+        roi = parse_roi(args.roi) if args.roi else None
+        if args.motion_gate:
+            gate = MotionGate(roi=roi, method=args.motion_gate)
+        else:
+            # ROI crop only: never gate on motion
+            gate = MotionGate(roi=roi, min_area=-1)
+
+    if telemetry is not None:
+        source = args.stream if args.stream is not None else 'webcam'
+        telemetry.watch(source, gate)
+        telemetry.watch(source, arduino)
+
+    detector = None
+    if detector_future is not None:
+        try:
+            detector = detector_future.result()
+        except Exception as e:
+            print(f"Error loading {args.backend} model. Make sure the file exists "
+                  f"(export it with scripts/export_model.py for onnx/openvino).")
+            print(f"Details: {e}")
+            sys.exit(1)
+        startup.mark('model_ready', "Model ready")
+
+    if args.serve:
+        from serve import serve_helmet_detection
+        serve_helmet_detection(args.host, args.serve, detector=detector, max_batch=args.max_batch,
+                               max_wait_ms=args.max_wait_ms, threshold=args.threshold, profiler=profiler,
+                               telemetry=telemetry)
+    elif args.multi:
+        from multicam import multi_helmet_detection
+        multi_helmet_detection(args.multi, detector=detector, threshold=args.threshold, max_batch=args.max_batch,
+                               max_frames=args.max_frames, duration=args.duration, realtime=not args.no_realtime,
+                               smoothing=not args.no_smoothing, queue_size=args.queue_size,
+                               motion_gate=args.motion_gate, use_arduino=not args.no_arduino, evidence=evidence,
+                               telemetry=telemetry, profiler=profiler)
+    elif args.batch:
+        from batch import batch_helmet_detection
+        batch_helmet_detection(args.batch, detector=detector, output=args.output, batch_size=args.batch_size,
+                               workers=args.workers, threshold=args.threshold, profiler=profiler, cache=cache)
+    elif args.stream is not None and args.track:
+        from tracker import tracked_helmet_detection
+        tracked_helmet_detection(args.stream, detector=detector, arduino=arduino, detect_every=args.detect_every,
+                                 threshold=args.threshold, max_frames=args.max_frames, duration=args.duration,
+                                 realtime=not args.no_realtime, gate=gate, evidence=evidence,
+                                 telemetry=telemetry, profiler=profiler)
+    elif args.stream is not None:
+        from stream import stream_helmet_detection
+        stream_helmet_detection(args.stream, detector=detector, arduino=arduino, threshold=args.threshold,
+                                max_frames=args.max_frames, duration=args.duration,
+                                realtime=not args.no_realtime, smoothing=not args.no_smoothing, gate=gate,
+                                evidence=evidence, telemetry=telemetry, tiler=tiler, profiler=profiler)
+    elif args.webcam:
+        live_helmet_detection(detector=detector, arduino=arduino, profiler=profiler, evidence=evidence,
+                              telemetry=telemetry, tiler=tiler)
+    elif args.server:
+        for image_to_test in args.images:
+            remote_helmet_detection(image_to_test, args.server, arduino=arduino, profiler=profiler,
+                                    camera=args.camera_name)
     else:
-        image_to_test = sys.argv[1]
-        classify_helmet_usage(image_to_test) 
\ No newline at end of file
+        # The model is loaded once and shared by every image on the command line
+        for image_to_test in args.images:
+            classify_helmet_usage(image_to_test, detector=detector, arduino=arduino, profiler=profiler,
+                                  cache=cache, evidence=evidence, telemetry=telemetry, tiler=tiler)
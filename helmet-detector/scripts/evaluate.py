@@ -0,0 +1,412 @@
+"""
+Dataset evaluation with cached predictions.
+
+Step 1 runs the model over a split once, at a very low confidence floor, and
+stores every prediction in one compressed .npz file. Step 2 computes mAP,
+precision/recall and the image-level PASS/FAIL confusion for any set of
+thresholds straight from that cache, in seconds, without the model.
+
+The same cache makes input-size tuning cheap: tune-imgsz predicts the
+validation split once per candidate size and picks the smallest one whose
+recall stays within a tolerance of the largest.
+
+Usage:
+  python scripts/evaluate.py predict --split test [--backend onnx --int8] [--imgsz 416]
+  python scripts/evaluate.py report --split test --thresholds 0.3,0.4,0.5 [--json eval_test.json]
+  python scripts/evaluate.py tune-imgsz --split valid --sizes 320,416,512,640 --tolerance 0.02
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from helmet_detector import BACKENDS, CLASS_NAMES, model_path_for
+from label_index import LabelIndex
+from verdict import CONFIDENCE_THRESHOLD, HELMET_CLASS, NO_HELMET_CLASS, NUM_CLASSES, VERDICT_TABLE
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(script_dir, '..', 'dataset')
+CACHE_DIR = os.path.join(DATASET_DIR, '.cache')
+
+# Predictions are cached down to this confidence so any higher threshold can be evaluated later
+CONF_FLOOR = 0.001
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+DEFAULT_THRESHOLDS = (0.25, 0.3, 0.35, 0.4, 0.45, 0.5, 0.55, 0.6, 0.7)
+DEFAULT_SIZES = (320, 384, 416, 480, 512, 640)
+VERDICTS = ('PASS', 'FAIL', 'CONFLICT', 'NO_DETECTION')
+
+
+def split_dirs(split):
+    return os.path.join(DATASET_DIR, split, 'images'), os.path.join(DATASET_DIR, split, 'labels')
+
+
+def cache_path(split, backend='torch', int8=False, imgsz=None):
+    name = backend + ('-int8' if int8 else '') + (f'-{imgsz}' if imgsz else '')
+    return os.path.join(CACHE_DIR, f'predictions_{split}_{name}.npz')
+
+
+def load_ground_truth(split, names):
+    """
+    Ground-truth (class_ids, normalized xyxy boxes) for the given image names,
+    in the same order, read from the split's memory-mapped label index.
+    """
+    return LabelIndex(split).ground_truth(names)
+
+
+def predict(split='test', backend='torch', int8=False, batch_size=16, workers=None, output=None, imgsz=None):
+    """
+    Run the model over a split once and cache every prediction (normalized xyxy, score, class).
+    """
+    from batch import MAX_SIDE, bounded_map, load_image
+    from helmet_detector import HelmetDetector
+    from stream import list_images
+    from verdict import to_numpy
+
+    images_dir, _ = split_dirs(split)
+    paths = list_images(images_dir)
+    model_path = model_path_for(backend, int8)
+    detector = HelmetDetector(model_path, imgsz=imgsz)
+    output = output or cache_path(split, backend, int8, imgsz)
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    # Workers pre-shrink to the inference size, never below the default, so sizes above 640 see full detail
+    max_side = max(MAX_SIDE, imgsz or 0)
+
+    names, boxes, scores, classes, counts = [], [], [], [], []
+    infer_s = 0.0
+    started = time.perf_counter()
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+
+    def run(chunk):
+        nonlocal infer_s
+        batch_start = time.perf_counter()
+        results = detector.detect_batch([item[1] for item in chunk], conf=CONF_FLOOR)
+        infer_s += time.perf_counter() - batch_start
+        for (path, frame, scale, _, _), result in zip(chunk, results):
+            rows = to_numpy(result.boxes.data)
+            h, w = frame.shape[:2]
+            norm = np.array([w, h, w, h], dtype=np.float32)
+            names.append(os.path.basename(path))
+            boxes.append(rows[:, :4] / norm)
+            scores.append(rows[:, 4])
+            classes.append(rows[:, 5].astype(np.int16))
+            counts.append(len(rows))
+
+    # Images are decoded a bounded window ahead and inferred batch by batch, so the split never sits in memory
+    chunk = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for done, item in enumerate(bounded_map(pool, load_image, paths, batch_size * workers, max_side), 1):
+            if item[1] is not None:
+                chunk.append(item)
+            if len(chunk) == batch_size:
+                run(chunk)
+                chunk = []
+            if done % batch_size == 0 or done == len(paths):
+                print(f"[EVAL] {done}/{len(paths)} images", end='\r')
+        if chunk:
+            run(chunk)
+
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+    np.savez_compressed(
+        output,
+        names=np.asarray(names),
+        offsets=offsets,
+        boxes=np.concatenate(boxes) if boxes else np.zeros((0, 4), np.float32),
+        scores=np.concatenate(scores) if scores else np.zeros(0, np.float32),
+        classes=np.concatenate(classes) if classes else np.zeros(0, np.int16),
+        model=np.asarray(model_path),
+        model_mtime=np.asarray(os.path.getmtime(model_path)),
+        conf_floor=np.asarray(CONF_FLOOR),
+        imgsz=np.asarray(imgsz or 0),
+        infer_ms=np.asarray(infer_s * 1000 / max(1, len(names))),
+    )
+    print(f"\n[EVAL] Cached {offsets[-1]} predictions for {len(names)} {split} images "
+          f"in {time.perf_counter() - started:.1f}s -> {output}")
+    return output
+
+
+def load_predictions(path):
+    with np.load(path, allow_pickle=False) as data:
+        return {key: data[key] for key in data.files}
+
+
+def box_iou(a, b):
+    """
+    IoU matrix between Nx4 and Mx4 xyxy boxes.
+    """
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_predictions(pred_boxes, pred_classes, gt_boxes, gt_classes):
+    """
+    True-positive flags (N x 10 IoU thresholds) using the same one-to-one,
+    highest-IoU-first matching as Ultralytics' validator.
+    """
+    tp = np.zeros((len(pred_boxes), len(IOU_THRESHOLDS)), dtype=bool)
+    if not len(pred_boxes) or not len(gt_boxes):
+        return tp
+    iou = box_iou(gt_boxes, pred_boxes) * (gt_classes[:, None] == pred_classes[None, :])
+    for k, threshold in enumerate(IOU_THRESHOLDS):
+        gt_idx, pred_idx = np.nonzero(iou >= threshold)
+        if not len(gt_idx):
+            continue
+        order = np.argsort(-iou[gt_idx, pred_idx], kind='stable')
+        gt_idx, pred_idx = gt_idx[order], pred_idx[order]
+        _, first = np.unique(pred_idx, return_index=True)
+        gt_idx, pred_idx = gt_idx[first], pred_idx[first]
+        _, first = np.unique(gt_idx, return_index=True)
+        tp[pred_idx[first], k] = True
+    return tp
+
+
+def average_precision(tp, n_gt):
+    """
+    101-point interpolated AP for one class from TP flags sorted by descending score.
+    """
+    if n_gt == 0:
+        return float('nan')
+    if not len(tp):
+        return 0.0
+    tpc = np.cumsum(tp)
+    recall = tpc / n_gt
+    precision = tpc / np.arange(1, len(tp) + 1)
+    mrec = np.concatenate([[0.0], recall, [1.0]])
+    mpre = np.concatenate([[1.0], precision, [0.0]])
+    mpre = np.flip(np.maximum.accumulate(np.flip(mpre)))
+    x = np.linspace(0, 1, 101)
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    return float(trapezoid(np.interp(x, mrec, mpre), x))
+
+
+class Evaluation:
+    """
+    Everything threshold-independent, computed once from the cache: TP flags
+    per prediction, per-image max confidence per class and the ground-truth verdicts.
+    """
+
+    def __init__(self, predictions, ground_truth):
+        offsets = predictions['offsets']
+        n_images = len(offsets) - 1
+        self.scores = predictions['scores'].astype(np.float32)
+        self.classes = predictions['classes'].astype(np.int64)
+        self.tp = np.zeros((len(self.scores), len(IOU_THRESHOLDS)), dtype=bool)
+        self.n_gt = np.zeros(NUM_CLASSES, dtype=np.int64)
+        gt_present = np.zeros((n_images, NUM_CLASSES), dtype=bool)
+        for i, (gt_classes, gt_boxes) in enumerate(ground_truth):
+            lo, hi = offsets[i], offsets[i + 1]
+            self.tp[lo:hi] = match_predictions(predictions['boxes'][lo:hi], self.classes[lo:hi],
+                                               gt_boxes, gt_classes)
+            known = gt_classes[(gt_classes >= 0) & (gt_classes < NUM_CLASSES)]
+            self.n_gt += np.bincount(known, minlength=NUM_CLASSES)
+            gt_present[i, known] = True
+        self.gt_verdicts = VERDICT_TABLE[gt_present[:, HELMET_CLASS].astype(np.intp),
+                                         gt_present[:, NO_HELMET_CLASS].astype(np.intp)]
+
+        # Per-image max confidence per class, so any threshold is one comparison
+        image_idx = np.repeat(np.arange(n_images), np.diff(offsets))
+        known = (self.classes >= 0) & (self.classes < NUM_CLASSES)
+        flat = image_idx[known] * NUM_CLASSES + self.classes[known]
+        max_conf = np.zeros(n_images * NUM_CLASSES, dtype=np.float32)
+        np.maximum.at(max_conf, flat, self.scores[known])
+        self.max_conf = max_conf.reshape(n_images, NUM_CLASSES)
+        self.order = np.argsort(-self.scores, kind='stable')
+
+    def map(self):
+        """
+        Per-class AP50 and AP50-95 at the cached confidence floor.
+        """
+        per_class = {}
+        for c in range(NUM_CLASSES):
+            idx = self.order[self.classes[self.order] == c]
+            aps = [average_precision(self.tp[idx, k], self.n_gt[c]) for k in range(len(IOU_THRESHOLDS))]
+            per_class[CLASS_NAMES[c]] = {'ap50': aps[0], 'ap50_95': float(np.mean(aps))}
+        ap50 = [v['ap50'] for v in per_class.values() if not np.isnan(v['ap50'])]
+        ap = [v['ap50_95'] for v in per_class.values() if not np.isnan(v['ap50_95'])]
+        return {
+            'map50': float(np.mean(ap50)) if ap50 else 0.0,
+            'map50_95': float(np.mean(ap)) if ap else 0.0,
+            'per_class': per_class,
+        }
+
+    def at_threshold(self, threshold):
+        """
+        Box precision/recall at IoU 0.5 and the image-level verdict confusion at one threshold.
+        """
+        keep = self.scores > threshold
+        boxes = {}
+        for c in range(NUM_CLASSES):
+            sel = keep & (self.classes == c)
+            tp = int(self.tp[sel, 0].sum())
+            n_pred = int(sel.sum())
+            boxes[CLASS_NAMES[c]] = {
+                'precision': tp / n_pred if n_pred else 0.0,
+                'recall': tp / self.n_gt[c] if self.n_gt[c] else 0.0,
+            }
+
+        present = (self.max_conf > threshold).astype(np.intp)
+        predicted = VERDICT_TABLE[present[:, HELMET_CLASS], present[:, NO_HELMET_CLASS]]
+        confusion = {gt: {p: int(np.sum((self.gt_verdicts == gt) & (predicted == p))) for p in VERDICTS}
+                     for gt in VERDICTS}
+        # The gate only opens on PASS: a false PASS lets a rider without a helmet through
+        gt_pass = self.gt_verdicts == 'PASS'
+        pred_pass = predicted == 'PASS'
+        return {
+            'threshold': threshold,
+            'boxes': boxes,
+            'verdict_accuracy': float(np.mean(predicted == self.gt_verdicts)) if len(predicted) else 0.0,
+            'false_pass_rate': float(np.mean(pred_pass[~gt_pass])) if np.any(~gt_pass) else 0.0,
+            'false_fail_rate': float(np.mean(~pred_pass[gt_pass])) if np.any(gt_pass) else 0.0,
+            'confusion': confusion,
+        }
+
+
+def report(split='test', backend='torch', int8=False, thresholds=DEFAULT_THRESHOLDS, cache=None, output=None,
+           imgsz=None):
+    """
+    mAP plus a threshold sweep computed entirely from the prediction cache.
+    """
+    cache = cache or cache_path(split, backend, int8, imgsz)
+    if not os.path.exists(cache):
+        print(f"Error: No prediction cache at {cache}")
+        print(f"Run: python scripts/evaluate.py predict --split {split} --backend {backend}"
+              f"{' --int8' if int8 else ''}{f' --imgsz {imgsz}' if imgsz else ''}")
+        return None
+
+    started = time.perf_counter()
+    predictions = load_predictions(cache)
+    model_path = str(predictions['model'])
+    if os.path.exists(model_path) and os.path.getmtime(model_path) != float(predictions['model_mtime']):
+        print(f"⚠️ WARNING: {model_path} changed since the cache was written - re-run predict")
+    names = [str(n) for n in predictions['names']]
+    evaluation = Evaluation(predictions, load_ground_truth(split, names))
+    results = {'split': split, 'cache': cache, 'images': len(names), **evaluation.map(),
+               'sweep': [evaluation.at_threshold(t) for t in thresholds]}
+    elapsed = time.perf_counter() - started
+
+    print("\n" + "="*72)
+    print(f"EVALUATION: {split} split, {len(names)} images ({elapsed:.2f}s from cache)")
+    print("="*72)
+    print(f"mAP50: {results['map50']:.3f}   mAP50-95: {results['map50_95']:.3f}")
+    for name, ap in results['per_class'].items():
+        print(f"  {name:<15} AP50 {ap['ap50']:.3f}   AP50-95 {ap['ap50_95']:.3f}")
+    print(f"\n{'thresh':>7}{'P helmet':>10}{'R helmet':>10}{'P none':>9}{'R none':>9}"
+          f"{'verdict acc':>13}{'false PASS':>12}{'false FAIL':>12}")
+    helmet, none = CLASS_NAMES[HELMET_CLASS], CLASS_NAMES[NO_HELMET_CLASS]
+    for row in results['sweep']:
+        b = row['boxes']
+        print(f"{row['threshold']:>7.2f}{b[helmet]['precision']:>10.3f}{b[helmet]['recall']:>10.3f}"
+              f"{b[none]['precision']:>9.3f}{b[none]['recall']:>9.3f}{row['verdict_accuracy']:>13.3f}"
+              f"{row['false_pass_rate']:>12.3f}{row['false_fail_rate']:>12.3f}")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[EVAL] Report written to {output}")
+    return results
+
+
+def tune_imgsz(split='valid', sizes=DEFAULT_SIZES, tolerance=0.02, threshold=CONFIDENCE_THRESHOLD,
+               backend='torch', int8=False, batch_size=16, workers=None, output=None):
+    """
+    Smallest input size whose per-class recall at `threshold` is within `tolerance`
+    of the largest size's. Predictions for each size are cached and reused.
+    """
+    sizes = sorted(set(sizes))
+    names = None
+    rows = []
+    for imgsz in sizes:
+        path = cache_path(split, backend, int8, imgsz)
+        model_path = model_path_for(backend, int8)
+        if os.path.exists(path):
+            predictions = load_predictions(path)
+            if os.path.getmtime(model_path) != float(predictions['model_mtime']):
+                predictions = None
+        else:
+            predictions = None
+        if predictions is None:
+            predictions = load_predictions(predict(split, backend, int8, batch_size, workers, path, imgsz))
+        if names is None:
+            names = [str(n) for n in predictions['names']]
+            ground_truth = load_ground_truth(split, names)
+        at = Evaluation(predictions, ground_truth).at_threshold(threshold)
+        rows.append({
+            'imgsz': imgsz,
+            'recall': {name: b['recall'] for name, b in at['boxes'].items()},
+            'verdict_accuracy': at['verdict_accuracy'],
+            'false_pass_rate': at['false_pass_rate'],
+            'infer_ms': float(predictions['infer_ms']) if 'infer_ms' in predictions else None,
+        })
+
+    reference = rows[-1]
+    chosen = next(row for row in rows
+                  if all(row['recall'][name] >= recall - tolerance for name, recall in reference['recall'].items()))
+    results = {'split': split, 'threshold': threshold, 'tolerance': tolerance, 'reference': reference['imgsz'],
+               'imgsz': chosen['imgsz'], 'sizes': rows}
+
+    helmet, none = CLASS_NAMES[HELMET_CLASS], CLASS_NAMES[NO_HELMET_CLASS]
+    print("\n" + "="*72)
+    print(f"INPUT SIZE TUNING: {split} split, threshold {threshold}, recall tolerance {tolerance}")
+    print("="*72)
+    print(f"{'imgsz':>6}{'R helmet':>10}{'R none':>9}{'verdict acc':>13}{'false PASS':>12}{'ms/image':>10}")
+    for row in rows:
+        ms = f"{row['infer_ms']:.1f}" if row['infer_ms'] is not None else '-'
+        mark = '  <- chosen' if row is chosen else ''
+        print(f"{row['imgsz']:>6}{row['recall'][helmet]:>10.3f}{row['recall'][none]:>9.3f}"
+              f"{row['verdict_accuracy']:>13.3f}{row['false_pass_rate']:>12.3f}{ms:>10}{mark}")
+    print(f"\nUse: python scripts/detect.py --imgsz {chosen['imgsz']} ...")
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"[EVAL] Tuning report written to {output}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in (('predict', "run the model once and cache predictions"),
+                            ('report', "metrics and threshold sweep from the cache")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--split', default='test', choices=['test', 'valid', 'train'])
+        p.add_argument('--backend', choices=BACKENDS, default='torch')
+        p.add_argument('--int8', action='store_true')
+        p.add_argument('--cache', help="prediction cache path (default: dataset/.cache/predictions_<split>_<backend>.npz)")
+        p.add_argument('--imgsz', type=int, help="inference size (default: 640, cached separately when given)")
+    tune = sub.add_parser('tune-imgsz', help="smallest input size that keeps recall within a tolerance")
+    tune.add_argument('--split', default='valid', choices=['test', 'valid', 'train'])
+    tune.add_argument('--backend', choices=BACKENDS, default='torch')
+    tune.add_argument('--int8', action='store_true')
+    tune.add_argument('--sizes', default=','.join(str(s) for s in DEFAULT_SIZES),
+                      help="comma-separated candidate sizes (multiples of 32); the largest is the reference")
+    tune.add_argument('--tolerance', type=float, default=0.02, help="allowed absolute recall drop per class")
+    tune.add_argument('--threshold', type=float, default=CONFIDENCE_THRESHOLD)
+    tune.add_argument('--json', help="also write the tuning report as JSON")
+    for name in ('predict', 'tune-imgsz'):
+        sub.choices[name].add_argument('--batch-size', type=int, default=16)
+        sub.choices[name].add_argument('--workers', type=int)
+    sub.choices['report'].add_argument('--thresholds', default=','.join(str(t) for t in DEFAULT_THRESHOLDS),
+                                       help="comma-separated confidence thresholds to sweep")
+    sub.choices['report'].add_argument('--json', help="also write the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == 'predict':
+        predict(args.split, args.backend, args.int8, args.batch_size, args.workers, args.cache, args.imgsz)
+    elif args.command == 'tune-imgsz':
+        sizes = [int(s) for s in args.sizes.split(',')]
+        tune_imgsz(args.split, sizes, args.tolerance, args.threshold, args.backend, args.int8,
+                   args.batch_size, args.workers, args.json)
+    else:
+        thresholds = [float(t) for t in args.thresholds.split(',')]
+        report(args.split, args.backend, args.int8, thresholds, args.cache, args.json, args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
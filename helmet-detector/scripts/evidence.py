@@ -0,0 +1,183 @@
+import os
+import queue
+import threading
+import time
+
+from helmet_detector import CLASS_NAMES
+from profiling import NULL_PROFILER
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Annotated decision frames go here, see EvidenceWriter
+EVIDENCE_DIR = os.path.join(script_dir, '..', 'evidence')
+SAVE_POLICIES = ('none', 'fail', 'every', 'all')
+CLASS_COLORS = {'With Helmet': (0, 255, 0), 'Without Helmet': (0, 0, 255)}
+
+
+def render_evidence(frame, detections, verdict, status=None):
+    """
+    Copy of `frame` with every detection box, its label and the verdict drawn on it.
+    """
+    import cv2
+    result_frame = frame.copy()
+    for x1, y1, x2, y2, confidence, class_id in detections:
+        class_name = CLASS_NAMES.get(int(class_id), 'unknown')
+        color = CLASS_COLORS.get(class_name, (128, 128, 128))
+        x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+        cv2.rectangle(result_frame, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(result_frame, f"{class_name}: {confidence:.2f}", (x1, y1 - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, color, 2)
+    if status:
+        cv2.putText(result_frame, status, (50, 50), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 3)
+    cv2.putText(result_frame, f"Result: {verdict}", (50, 100), cv2.FONT_HERSHEY_SIMPLEX, 1, (255, 255, 255), 2)
+    return result_frame
+
+
+class EvidenceWriter:
+    """
+    Saves annotated decision frames without blocking the gate.
+
+    `submit()` only applies the policy and queues a reference to the frame;
+    a background thread draws the boxes, JPEG-encodes and writes the file.
+    When the bounded queue is full the new frame is dropped rather than
+    delaying the caller. With `max_bytes`, the oldest evidence files in
+    `directory` are deleted to stay under the cap.
+
+    Policies: 'none', 'fail' (every non-PASS decision), 'every' (every
+    `every`-th decision) and 'all'. Continuous sources offer every frame only
+    when `per_frame` is set; under 'fail' they offer settled state changes.
+    """
+
+    def __init__(self, directory=EVIDENCE_DIR, policy='fail', every=10, quality=90, max_bytes=None,
+                 queue_size=8, prefix='helmet_test', profiler=NULL_PROFILER):
+        if policy not in SAVE_POLICIES:
+            raise ValueError(f"Unknown save policy {policy!r}, expected one of {SAVE_POLICIES}")
+        self.directory = directory
+        self.policy = policy
+        self.every = max(1, every)
+        self.quality = quality
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.profiler = profiler
+        self.decisions = 0
+        self.saved = 0
+        self.dropped = 0
+        self.evicted = 0
+        self.errors = 0
+        self.last_path = None
+        self._files = []  # (path, size) of evidence files, oldest first
+        self._bytes = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.max_bytes:
+            existing = [os.path.join(self.directory, n) for n in os.listdir(self.directory)
+                        if n.startswith(self.prefix) and n.endswith('.jpg')]
+            existing.sort(key=os.path.getmtime)
+            self._files = [(p, os.path.getsize(p)) for p in existing]
+            self._bytes = sum(size for _, size in self._files)
+        self._thread = threading.Thread(target=self._run, name='evidence-writer', daemon=True)
+        self._thread.start()
+        return self
+
+    @property
+    def per_frame(self):
+        return self.policy in ('every', 'all')
+
+    def wants(self, verdict):
+        """
+        Count one decision and tell whether the policy keeps it.
+        """
+        self.decisions += 1
+        if self.policy == 'all':
+            return True
+        if self.policy == 'fail':
+            return verdict != 'PASS'
+        if self.policy == 'every':
+            return self.decisions % self.every == 0
+        return False
+
+    def submit(self, frame, detections, verdict, status=None, tag=None):
+        """
+        Queue one scored frame (a BGR array, or an image path decoded on the worker).
+        The caller must not modify `frame` afterwards. Returns True if it was queued.
+        """
+        if not self.wants(verdict):
+            return False
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait((frame, detections, verdict, status, tag, time.time()))
+        except queue.Full:
+            self.dropped += 1
+            return False
+        return True
+
+    def close(self, timeout=5.0):
+        """
+        Write everything still queued, then stop the worker.
+        """
+        if self._thread is None:
+            return
+        self._queue.put((None, None, None, None, None, None))
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        return {
+            'policy': self.policy,
+            'decisions': self.decisions,
+            'saved': self.saved,
+            'dropped': self.dropped,
+            'evicted': self.evicted,
+            'errors': self.errors,
+            'bytes': self._bytes,
+        }
+
+    def _run(self):
+        while True:
+            frame, detections, verdict, status, tag, stamp = self._queue.get()
+            if verdict is None:
+                return
+            start = time.perf_counter()
+            try:
+                self._write(frame, detections, verdict, status, tag, stamp)
+            except Exception as e:
+                self.errors += 1
+                print(f"❌ Error saving frame: {e}")
+            self.profiler.record('save', time.perf_counter() - start)
+
+    def _write(self, frame, detections, verdict, status, tag, stamp):
+        import cv2  # Only the writer thread needs OpenCV
+        if isinstance(frame, str):
+            frame = cv2.imread(frame)
+            if frame is None:
+                raise OSError("could not decode the scored image")
+        ok, encoded = cv2.imencode('.jpg', render_evidence(frame, detections, verdict, status),
+                                   [cv2.IMWRITE_JPEG_QUALITY, int(self.quality)])
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+
+        millis = int(stamp * 1000) % 1000
+        name = '_'.join(p for p in (self.prefix, tag, str(verdict)) if p)
+        # The sequence number keeps two saves within the same millisecond apart
+        filename = (f"{name}_{time.strftime('%Y%m%d_%H%M%S', time.localtime(stamp))}_{millis:03d}"
+                    f"_{self.saved + 1:06d}.jpg")
+        path = os.path.join(self.directory, filename)
+        with open(path, 'wb') as f:
+            f.write(encoded.tobytes())
+        self.saved += 1
+        self.last_path = path
+        self._files.append((path, len(encoded)))
+        self._bytes += len(encoded)
+
+        while self.max_bytes and self._bytes > self.max_bytes and len(self._files) > 1:
+            old_path, size = self._files.pop(0)
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+            self._bytes -= size
+            self.evicted += 1
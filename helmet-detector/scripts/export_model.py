@@ -0,0 +1,228 @@
+"""
+Export best.pt to CPU-friendly backends and compare them against PyTorch.
+
+Usage:
+  python scripts/export_model.py export --backend onnx [--int8]
+  python scripts/export_model.py export --backend openvino [--int8]
+  python scripts/export_model.py compare [--split test] [--output backend_report.json]
+
+INT8 variants are post-training quantized, calibrated on dataset/valid/images.
+ONNX quantization needs `onnxruntime`, OpenVINO export needs `openvino`
+(and `nncf` for INT8); both are optional.
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from helmet_detector import BACKENDS, MODEL_PATH, HelmetDetector, model_path_for
+from stream import list_images
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(script_dir, '..', 'dataset')
+DATA_YAML = os.path.abspath(os.path.join(DATASET_DIR, 'data.yaml'))
+CALIBRATION_DIR = os.path.join(DATASET_DIR, 'valid', 'images')
+IMGSZ = 640
+
+
+def letterbox(img, size=IMGSZ, color=(114, 114, 114)):
+    """
+    Resize keeping aspect ratio and pad to size x size, as Ultralytics does before inference.
+    """
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    resized = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    out = np.full((size, size, 3), color, dtype=np.uint8)
+    out[top:top + nh, left:left + nw] = resized
+    return out
+
+
+def to_input_tensor(img, size=IMGSZ):
+    """
+    BGR uint8 image -> 1x3xHxW float32 RGB tensor in [0, 1] (the exported model's input).
+    """
+    rgb = cv2.cvtColor(letterbox(img, size), cv2.COLOR_BGR2RGB)
+    return np.ascontiguousarray(rgb.transpose(2, 0, 1)[None], dtype=np.float32) / 255.0
+
+
+def calibration_images(directory=CALIBRATION_DIR, count=200, seed=0):
+    """
+    A fixed random sample of calibration images so repeated exports are reproducible.
+    """
+    paths = list_images(directory)
+    rng = np.random.default_rng(seed)
+    if len(paths) > count:
+        paths = [paths[i] for i in sorted(rng.choice(len(paths), count, replace=False))]
+    return paths
+
+
+def quantize_onnx(fp32_path, int8_path, imgsz=IMGSZ, calibration_count=200):
+    """
+    Static INT8 post-training quantization of an ONNX export with ONNX Runtime.
+    """
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    import onnxruntime
+
+    input_name = onnxruntime.InferenceSession(fp32_path, providers=['CPUExecutionProvider']).get_inputs()[0].name
+    paths = calibration_images(count=calibration_count)
+
+    class ValidImages(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(paths)
+
+        def get_next(self):
+            for path in self._paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: to_input_tensor(img, imgsz)}
+            return None
+
+    prepared = fp32_path.replace('.onnx', '_prep.onnx')
+    quant_pre_process(fp32_path, prepared)
+    print(f"[EXPORT] Calibrating INT8 on {len(paths)} images from {CALIBRATION_DIR}")
+    quantize_static(prepared, int8_path, ValidImages(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    os.remove(prepared)
+    return int8_path
+
+
+def export(backend, int8=False, imgsz=IMGSZ, calibration_count=200):
+    """
+    Export best.pt to `backend` and move the result to the path model_path_for() expects.
+    """
+    from ultralytics import YOLO
+
+    if backend == 'torch':
+        print("[EXPORT] torch is the source model, nothing to export")
+        return MODEL_PATH
+
+    target = model_path_for(backend, int8)
+    model = YOLO(MODEL_PATH)
+    started = time.perf_counter()
+    if backend == 'onnx':
+        fp32_path = model.export(format='onnx', imgsz=imgsz, simplify=True, dynamic=True)
+        if int8:
+            quantize_onnx(fp32_path, target, imgsz, calibration_count)
+        elif os.path.abspath(fp32_path) != os.path.abspath(target):
+            shutil.move(fp32_path, target)
+    else:
+        exported = model.export(format='openvino', imgsz=imgsz, int8=int8, data=DATA_YAML,
+                                fraction=min(1.0, calibration_count / max(1, len(list_images(CALIBRATION_DIR)))))
+        if os.path.abspath(exported) != os.path.abspath(target):
+            shutil.rmtree(target, ignore_errors=True)
+            shutil.move(exported, target)
+    print(f"[EXPORT] {backend}{' INT8' if int8 else ''} model written to {target} "
+          f"in {time.perf_counter() - started:.1f}s")
+    return target
+
+
+def measure(model_path, images, batch_size=8, repeats=50, split='test', imgsz=IMGSZ):
+    """
+    Latency, throughput and mAP of one exported model on a dataset split.
+    """
+    detector = HelmetDetector(model_path)
+    frames = [cv2.imread(p) for p in images[:repeats]]
+    frames = [f for f in frames if f is not None]
+
+    latencies = []
+    for frame in frames:
+        start = time.perf_counter()
+        detector.detect(frame, imgsz=imgsz)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    # Static-shape exports (e.g. OpenVINO) only accept batch 1; fall back to sequential calls
+    start = time.perf_counter()
+    done = 0
+    for i in range(0, len(frames), batch_size):
+        chunk = frames[i:i + batch_size]
+        try:
+            detector.detect_batch(chunk, imgsz=imgsz)
+        except Exception:
+            for frame in chunk:
+                detector.detect(frame, imgsz=imgsz)
+        done += len(chunk)
+    throughput = done / (time.perf_counter() - start)
+
+    metrics = detector.model.val(data=DATA_YAML, split=split, imgsz=imgsz, batch=1,
+                                 plots=False, verbose=False)
+    return {
+        'model': model_path,
+        'latency_p50_ms': float(np.percentile(latencies, 50)),
+        'latency_p95_ms': float(np.percentile(latencies, 95)),
+        'throughput_ips': throughput,
+        'map50': float(metrics.box.map50),
+        'map50_95': float(metrics.box.map),
+    }
+
+
+def compare(split='test', output='backend_report.json', imgsz=IMGSZ, repeats=50):
+    """
+    Compare every exported backend that exists on disk against the PyTorch baseline.
+    """
+    images = list_images(os.path.join(DATASET_DIR, split, 'images'))
+    rows = {}
+    for backend in BACKENDS:
+        for int8 in (False, True):
+            if backend == 'torch' and int8:
+                continue
+            path = model_path_for(backend, int8)
+            if not os.path.exists(path):
+                continue
+            name = backend + ('-int8' if int8 else '')
+            print(f"[COMPARE] Measuring {name} ...")
+            try:
+                rows[name] = measure(path, images, repeats=repeats, split=split, imgsz=imgsz)
+            except Exception as e:
+                print(f"[COMPARE] {name} failed: {e}")
+
+    baseline = rows.get('torch')
+    if baseline:
+        for row in rows.values():
+            row['map50_drop'] = baseline['map50'] - row['map50']
+            row['speedup'] = baseline['latency_p50_ms'] / row['latency_p50_ms']
+
+    print("\n" + "="*78)
+    print(f"BACKEND COMPARISON ({split} split, imgsz {imgsz})")
+    print("="*78)
+    print(f"{'backend':<14}{'p50 ms':>9}{'p95 ms':>9}{'img/s':>9}{'mAP50':>8}{'mAP50-95':>10}{'drop':>8}{'speedup':>9}")
+    for name, r in rows.items():
+        print(f"{name:<14}{r['latency_p50_ms']:>9.1f}{r['latency_p95_ms']:>9.1f}{r['throughput_ips']:>9.1f}"
+              f"{r['map50']:>8.3f}{r['map50_95']:>10.3f}{r.get('map50_drop', 0):>8.3f}{r.get('speedup', 1):>8.2f}x")
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'split': split, 'imgsz': imgsz, 'backends': rows}, f, indent=2)
+    print(f"[COMPARE] Report written to {output}")
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help="export (and optionally INT8-quantize) best.pt")
+    exp.add_argument('--backend', choices=['onnx', 'openvino'], required=True)
+    exp.add_argument('--int8', action='store_true', help="post-training INT8 quantization")
+    exp.add_argument('--imgsz', type=int, default=IMGSZ)
+    exp.add_argument('--calibration-images', type=int, default=200)
+    cmp_ = sub.add_parser('compare', help="latency/throughput/mAP of every exported backend")
+    cmp_.add_argument('--split', default='test', choices=['test', 'valid'])
+    cmp_.add_argument('--imgsz', type=int, default=IMGSZ)
+    cmp_.add_argument('--repeats', type=int, default=50, help="images used for the latency measurement")
+    cmp_.add_argument('--output', default='backend_report.json')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export(args.backend, args.int8, args.imgsz, args.calibration_images)
+    else:
+        compare(args.split, args.output, args.imgsz, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import os
+
+# Get the directory of the current script to build absolute paths
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Path to the custom-trained helmet detection model
+MODEL_PATH = os.path.join(script_dir, '..', 'models', 'best.pt')
+
+# Exported variants of best.pt, see scripts/export_model.py
+BACKENDS = ('torch', 'onnx', 'openvino')
+MODELS_DIR = os.path.dirname(MODEL_PATH)
+
+# The model has 2 classes: 'With Helmet', 'Without Helmet'.
+# CORRECTED MAPPING based on data.yaml:
+CLASS_NAMES = {0: 'With Helmet', 1: 'Without Helmet'}
+
+
+def model_path_for(backend='torch', int8=False):
+    """
+    Path of the model file/directory for a backend, as written by export_model.py.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    suffix = '_int8' if int8 else ''
+    if backend == 'torch':
+        if int8:
+            raise ValueError("INT8 is only available for the onnx and openvino backends")
+        return MODEL_PATH
+    if backend == 'onnx':
+        return os.path.join(MODELS_DIR, f'best{suffix}.onnx')
+    return os.path.join(MODELS_DIR, f'best{suffix}_openvino_model')
+
+
+class HelmetDetector:
+    """
+    Long-lived wrapper around the YOLOv8 helmet model.
+
+    The weights are loaded once and a warm-up pass is run on a blank frame,
+    so every later check only pays for a single forward pass. `model_path`
+    may also point at an exported ONNX file or OpenVINO directory. `imgsz`
+    is the inference size used for every call (None keeps Ultralytics'
+    default of 640); exported models only accept the size they were exported at.
+
+    Ultralytics (and with it torch) is imported here rather than at module
+    level, so scripts that only need the constants below start instantly.
+    """
+
+    def __init__(self, model_path=MODEL_PATH, warmup=True, warmup_shape=(480, 640, 3), imgsz=None):
+        self.model_path = model_path
+        self.imgsz = imgsz
+        from ultralytics import YOLO
+        # Exported models carry no task metadata in older Ultralytics releases
+        self.model = YOLO(model_path, task='detect')
+        if warmup:
+            self.warmup(warmup_shape)
+
+    def warmup(self, shape=(480, 640, 3)):
+        """
+        Run one inference on a blank frame to trigger lazy initialisation.
+        """
+        import numpy as np
+        blank = np.zeros(shape, dtype=np.uint8)
+        self.detect(blank)
+
+    def detect(self, frame, **kwargs):
+        """
+        Run the model on a single frame and return its Results object.
+        """
+        kwargs.setdefault('verbose', False)
+        if self.imgsz:
+            kwargs.setdefault('imgsz', self.imgsz)
+        return self.model(frame, **kwargs)[0]
+
+    def detect_batch(self, frames, **kwargs):
+        """
+        Run the model on a list of frames in one call and return a list of Results.
+        """
+        frames = list(frames)
+        if not frames:
+            return []
+        kwargs.setdefault('verbose', False)
+        if self.imgsz:
+            kwargs.setdefault('imgsz', self.imgsz)
+        return list(self.model(frames, **kwargs))
+
+
+_shared_detector = None
+
+
+def get_detector(model_path=MODEL_PATH, imgsz=None):
+    """
+    Return the process-wide HelmetDetector, loading it on first use.
+    An `imgsz` given here replaces the shared detector's inference size.
+    """
+    global _shared_detector
+    if _shared_detector is None or _shared_detector.model_path != model_path:
+        _shared_detector = HelmetDetector(model_path, imgsz=imgsz)
+    elif imgsz is not None and imgsz != _shared_detector.imgsz:
+        _shared_detector.imgsz = imgsz
+        _shared_detector.warmup()
+    return _shared_detector
@@ -0,0 +1,239 @@
+"""
+Compact, memory-mapped index of the YOLO label files of a dataset split.
+
+Each split's thousands of small label files (bboxes or long segmentation
+polygons) are packed once into a handful of columnar .npy files:
+
+  names.npy            image stem per image
+  object_offsets.npy   (n_images + 1) start of each image's objects
+  class_ids.npy        class id per object
+  bboxes.npy           normalized xyxy box per object (derived from polygons)
+  vertex_offsets.npy   (n_objects + 1) start of each object's vertices
+  vertices.npy         normalized (x, y) polygon vertices (4 corners for bbox rows)
+
+Loading memory-maps them, so per-image lookups are zero-copy NumPy views.
+The index is rebuilt automatically when any label file is newer than it.
+
+Usage:
+  python scripts/label_index.py build [--split train valid test]
+  python scripts/label_index.py stats --split train
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DATASET_DIR = os.path.join(script_dir, '..', 'dataset')
+INDEX_DIR = os.path.join(DATASET_DIR, '.cache')
+INDEX_VERSION = 1
+ARRAYS = ('names', 'object_offsets', 'class_ids', 'bboxes', 'vertex_offsets', 'vertices')
+
+
+def labels_dir(split):
+    return os.path.join(DATASET_DIR, split, 'labels')
+
+
+def index_dir(split):
+    return os.path.join(INDEX_DIR, f'labels_{split}')
+
+
+def scan_labels(directory):
+    """
+    (sorted label file names, newest mtime_ns) with a single directory scan.
+    """
+    names = []
+    newest = os.stat(directory).st_mtime_ns
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith('.txt') and entry.is_file():
+                names.append(entry.name)
+                newest = max(newest, entry.stat().st_mtime_ns)
+    return sorted(names), newest
+
+
+def parse_rows(text):
+    """
+    Parse one label file's text into (class_id, vertices Nx2) rows.
+    Plain bbox rows (cx cy w h) become their 4 corners.
+    """
+    rows = []
+    for line in text.splitlines():
+        values = line.split()
+        if len(values) < 5:
+            continue
+        coords = np.asarray(values[1:], dtype=np.float32)
+        if len(coords) == 4:
+            cx, cy, w, h = coords
+            x1, y1, x2, y2 = cx - w / 2, cy - h / 2, cx + w / 2, cy + h / 2
+            vertices = np.array([[x1, y1], [x2, y1], [x2, y2], [x1, y2]], dtype=np.float32)
+        else:
+            vertices = coords[:len(coords) // 2 * 2].reshape(-1, 2)
+        rows.append((int(values[0]), vertices))
+    return rows
+
+
+def build_index(split):
+    """
+    Pack every label file of `split` into the columnar store and return its directory.
+    """
+    source = labels_dir(split)
+    started = time.perf_counter()
+    files, newest = scan_labels(source)
+
+    names, object_offsets, class_ids, vertex_counts, vertex_chunks = [], [0], [], [], []
+    for name in files:
+        with open(os.path.join(source, name), encoding='utf-8') as f:
+            rows = parse_rows(f.read())
+        names.append(name[:-4])
+        for class_id, vertices in rows:
+            class_ids.append(class_id)
+            vertex_counts.append(len(vertices))
+            vertex_chunks.append(vertices)
+        object_offsets.append(len(class_ids))
+
+    vertices = np.concatenate(vertex_chunks) if vertex_chunks else np.zeros((0, 2), np.float32)
+    vertex_offsets = np.concatenate([[0], np.cumsum(vertex_counts)]).astype(np.int64)
+    bboxes = np.zeros((len(class_ids), 4), dtype=np.float32)
+    if len(class_ids):
+        starts = vertex_offsets[:-1]
+        bboxes[:, 0] = np.minimum.reduceat(vertices[:, 0], starts)
+        bboxes[:, 1] = np.minimum.reduceat(vertices[:, 1], starts)
+        bboxes[:, 2] = np.maximum.reduceat(vertices[:, 0], starts)
+        bboxes[:, 3] = np.maximum.reduceat(vertices[:, 1], starts)
+
+    arrays = {
+        'names': np.asarray(names, dtype=str),
+        'object_offsets': np.asarray(object_offsets, dtype=np.int64),
+        'class_ids': np.asarray(class_ids, dtype=np.int16),
+        'bboxes': bboxes,
+        'vertex_offsets': vertex_offsets,
+        'vertices': vertices.astype(np.float32),
+    }
+
+    # Write to a temporary directory and swap it in, so readers never see half an index
+    target = index_dir(split)
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for key, value in arrays.items():
+        np.save(os.path.join(tmp, key + '.npy'), value)
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({'version': INDEX_VERSION, 'split': split, 'files': len(files),
+                   'newest_mtime_ns': newest, 'objects': len(class_ids),
+                   'vertices': len(vertices)}, f)
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+    print(f"[LABELS] Indexed {len(files)} {split} label files ({len(class_ids)} objects, "
+          f"{len(vertices)} vertices) in {time.perf_counter() - started:.1f}s -> {target}")
+    return target
+
+
+def is_stale(split):
+    """
+    True when the index is missing, from another version, or older than any label file.
+    """
+    meta_path = os.path.join(index_dir(split), 'meta.json')
+    if not os.path.exists(meta_path):
+        return True
+    with open(meta_path, encoding='utf-8') as f:
+        meta = json.load(f)
+    files, newest = scan_labels(labels_dir(split))
+    return (meta.get('version') != INDEX_VERSION or meta.get('files') != len(files)
+            or meta.get('newest_mtime_ns') != newest)
+
+
+class LabelIndex:
+    """
+    Read-only, memory-mapped view of one split's labels.
+    """
+
+    def __init__(self, split, auto_rebuild=True):
+        self.split = split
+        if auto_rebuild and is_stale(split):
+            build_index(split)
+        directory = index_dir(split)
+        for key in ARRAYS:
+            setattr(self, key, np.load(os.path.join(directory, key + '.npy'), mmap_mode='r'))
+        self._positions = None
+
+    def __len__(self):
+        return len(self.names)
+
+    def position(self, name):
+        """
+        Image index for an image file name or stem.
+        """
+        if self._positions is None:
+            self._positions = {str(n): i for i, n in enumerate(self.names)}
+        return self._positions[os.path.splitext(os.path.basename(name))[0]]
+
+    def objects(self, i):
+        """
+        (class_ids, bboxes) views for image `i`.
+        """
+        lo, hi = self.object_offsets[i], self.object_offsets[i + 1]
+        return self.class_ids[lo:hi], self.bboxes[lo:hi]
+
+    def polygons(self, i):
+        """
+        One Nx2 vertex view per object of image `i`.
+        """
+        lo, hi = self.object_offsets[i], self.object_offsets[i + 1]
+        return [self.vertices[self.vertex_offsets[j]:self.vertex_offsets[j + 1]] for j in range(lo, hi)]
+
+    def ground_truth(self, names=None):
+        """
+        (class_ids, bboxes) per image, for `names` or every image in index order.
+        Images without a label file get empty arrays.
+        """
+        if names is None:
+            return [self.objects(i) for i in range(len(self))]
+        empty = (self.class_ids[:0], self.bboxes[:0])
+        rows = []
+        for name in names:
+            try:
+                rows.append(self.objects(self.position(name)))
+            except KeyError:
+                rows.append(empty)
+        return rows
+
+    def stats(self):
+        class_counts = np.bincount(np.asarray(self.class_ids, dtype=np.int64)) if len(self.class_ids) else []
+        per_object = np.diff(self.vertex_offsets)
+        return {
+            'split': self.split,
+            'images': len(self),
+            'objects': len(self.class_ids),
+            'class_counts': [int(c) for c in class_counts],
+            'images_without_labels': int(np.sum(np.diff(self.object_offsets) == 0)),
+            'max_vertices_per_object': int(per_object.max()) if len(per_object) else 0,
+            'polygon_objects': int(np.sum(per_object != 4)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help="(re)build the index for one or more splits")
+    build.add_argument('--split', nargs='+', default=['train', 'valid', 'test'])
+    stats = sub.add_parser('stats', help="label statistics straight from the index")
+    stats.add_argument('--split', default='train')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        for split in args.split:
+            build_index(split)
+    else:
+        started = time.perf_counter()
+        index = LabelIndex(args.split)
+        result = index.stats()
+        print(json.dumps(result, indent=2))
+        print(f"[LABELS] Loaded in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
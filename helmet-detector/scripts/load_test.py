@@ -0,0 +1,126 @@
+"""
+Load generator for `detect.py --serve`.
+
+Posts images from a directory to /detect from several concurrent clients
+(one keep-alive connection each) and reports requests/s, latency
+percentiles and the batch sizes the server formed.
+
+Usage:
+  python scripts/load_test.py [--url http://127.0.0.1:8765] [--images input] [--concurrency 8] [--requests 500]
+"""
+import argparse
+import collections
+import http.client
+import json
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGES = os.path.join(script_dir, '..', 'input')
+
+# Same as stream.IMAGE_EXTENSIONS; not imported so the client doesn't pull in the model stack
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def run_client(url, payloads, count, latencies, errors, batch_sizes, lock, offset=0):
+    parsed = urlparse(url)
+    conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+    for i in range(count):
+        body = payloads[(offset + i) % len(payloads)]
+        start = time.perf_counter()
+        try:
+            conn.request('POST', '/detect', body=body, headers={'Content-Type': 'application/octet-stream'})
+            response = conn.getresponse()
+            payload = response.read()
+            elapsed = (time.perf_counter() - start) * 1000
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}: {payload[:200]!r}")
+            result = json.loads(payload)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+            conn.close()
+            conn = http.client.HTTPConnection(parsed.hostname, parsed.port or 80, timeout=60)
+            continue
+        with lock:
+            latencies.append(elapsed)
+            batch_sizes[result.get('batch_size', 1)] += 1
+    conn.close()
+
+
+def load_test(url='http://127.0.0.1:8765', images=DEFAULT_IMAGES, concurrency=8, requests=500):
+    """
+    Fire `requests` POSTs split across `concurrency` clients and return the measured numbers.
+    """
+    payloads = []
+    for name in sorted(os.listdir(images)):
+        if not name.lower().endswith(IMAGE_EXTENSIONS):
+            continue
+        with open(os.path.join(images, name), 'rb') as f:
+            payloads.append(f.read())
+    if not payloads:
+        raise SystemExit(f"Error: No images found in {images}")
+
+    latencies, errors = [], []
+    batch_sizes = collections.Counter()
+    lock = threading.Lock()
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0) for i in range(concurrency)]
+    threads = [threading.Thread(target=run_client, args=(url, payloads, n, latencies, errors, batch_sizes, lock, i))
+               for i, n in enumerate(per_client)]
+
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    lat = np.asarray(latencies) if latencies else np.zeros(1)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'seconds': elapsed,
+        'requests_per_sec': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'latency_p50_ms': float(np.percentile(lat, 50)),
+        'latency_p95_ms': float(np.percentile(lat, 95)),
+        'latency_p99_ms': float(np.percentile(lat, 99)),
+        'latency_max_ms': float(lat.max()),
+        'batch_sizes': {str(k): v for k, v in sorted(batch_sizes.items())},
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--images', default=DEFAULT_IMAGES, help="directory of JPEG/PNG files to send")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8],
+                        help="concurrent clients; several values run one pass each")
+    parser.add_argument('--requests', type=int, default=500, help="requests per pass")
+    parser.add_argument('--json', metavar='PATH', help="also write the results as JSON")
+    args = parser.parse_args()
+
+    rows = []
+    print(f"{'clients':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}  batch sizes")
+    for concurrency in args.concurrency:
+        r = load_test(args.url, args.images, concurrency, args.requests)
+        rows.append(r)
+        print(f"{concurrency:>8}{r['requests_per_sec']:>9.1f}{r['latency_p50_ms']:>9.1f}{r['latency_p95_ms']:>9.1f}"
+              f"{r['latency_p99_ms']:>9.1f}{r['latency_max_ms']:>9.1f}{r['errors']:>8}  {r['batch_sizes']}")
+        if r['first_error']:
+            print(f"  first error: {r['first_error']}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rows, f, indent=2)
+        print(f"[LOAD] Results written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
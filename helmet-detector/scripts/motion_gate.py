@@ -0,0 +1,139 @@
+import cv2
+import numpy as np
+
+# Width of the grayscale view used for all motion checks
+GATE_WIDTH = 160
+
+
+def small_gray(frame, width=GATE_WIDTH):
+    """
+    Downscaled grayscale view of a BGR frame for cheap per-frame checks.
+    """
+    scale = width / frame.shape[1]
+    if scale < 1:
+        frame = cv2.resize(frame, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+
+def motion_score(previous, current):
+    """
+    Mean absolute difference of two small grayscale frames (0-255).
+    """
+    if previous is None:
+        return 255.0
+    return float(cv2.absdiff(previous, current).mean())
+
+
+def parse_roi(text):
+    """
+    Parse "x,y,w,h" in pixels, or as fractions of the frame when every value is <= 1.
+    """
+    values = [float(v) for v in text.split(',')]
+    if len(values) != 4:
+        raise ValueError(f"ROI must be x,y,w,h, got {text!r}")
+    return tuple(values)
+
+
+def offset_rows(rows, origin):
+    """
+    Shift Nx6 detection rows from ROI-crop coordinates back to full-frame coordinates.
+    """
+    x0, y0 = origin
+    if x0 == 0 and y0 == 0:
+        return rows
+    rows = np.array(rows, dtype=np.float32, copy=True).reshape(-1, 6)
+    rows[:, [0, 2]] += x0
+    rows[:, [1, 3]] += y0
+    return rows
+
+
+class MotionGate:
+    """
+    Pre-filter that only lets frames with motion inside a region of interest through.
+
+    Motion is measured on a small grayscale view of the ROI, either against a
+    slowly-updated running background ('diff') or with OpenCV's MOG2
+    background subtractor ('mog2'). A frame passes when more than
+    `min_area` of the ROI changed; after that the gate stays open for
+    `hold_frames` so a rider who stops in front of the camera is still checked.
+    """
+
+    def __init__(self, roi=None, method='diff', pixel_threshold=25, min_area=0.02,
+                 hold_frames=15, learning_rate=0.05):
+        if method not in ('diff', 'mog2'):
+            raise ValueError(f"Unknown motion method: {method}")
+        self.roi = roi
+        self.method = method
+        self.pixel_threshold = pixel_threshold
+        self.min_area = min_area
+        self.hold_frames = hold_frames
+        self.learning_rate = learning_rate
+        self.frames_seen = 0
+        self.frames_gated = 0
+        self.frames_inferred = 0
+        self.last_motion = 0.0
+        self._background = None
+        self._hold = 0
+        self._subtractor = None
+        if method == 'mog2':
+            self._subtractor = cv2.createBackgroundSubtractorMOG2(history=300, detectShadows=False)
+
+    def roi_box(self, frame):
+        """
+        ROI as integer (x1, y1, x2, y2) pixels, clipped to the frame.
+        """
+        h, w = frame.shape[:2]
+        if self.roi is None:
+            return 0, 0, w, h
+        x, y, rw, rh = self.roi
+        if max(self.roi) <= 1:
+            x, y, rw, rh = x * w, y * h, rw * w, rh * h
+        x1, y1 = max(0, int(x)), max(0, int(y))
+        x2, y2 = min(w, int(x + rw)), min(h, int(y + rh))
+        return x1, y1, x2, y2
+
+    def crop(self, frame):
+        """
+        Return (roi_crop, (x0, y0)); the crop is a view, not a copy.
+        """
+        x1, y1, x2, y2 = self.roi_box(frame)
+        return frame[y1:y2, x1:x2], (x1, y1)
+
+    def check(self, frame):
+        """
+        True when the frame should be sent for inference.
+        """
+        self.frames_seen += 1
+        roi, _ = self.crop(frame)
+        gray = small_gray(roi)
+
+        if self._subtractor is not None:
+            mask = self._subtractor.apply(gray)
+            changed = float(np.count_nonzero(mask)) / mask.size
+        else:
+            gray = cv2.GaussianBlur(gray, (5, 5), 0)
+            if self._background is None or self._background.shape != gray.shape:
+                self._background = gray.astype(np.float32)
+                changed = 1.0
+            else:
+                diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+                changed = float(np.count_nonzero(diff > self.pixel_threshold)) / diff.size
+                cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+        self.last_motion = changed
+
+        if changed > self.min_area:
+            self._hold = self.hold_frames
+        elif self._hold > 0:
+            self._hold -= 1
+        else:
+            self.frames_gated += 1
+            return False
+        self.frames_inferred += 1
+        return True
+
+    def stats(self):
+        return {
+            'frames_seen': self.frames_seen,
+            'frames_gated': self.frames_gated,
+            'frames_inferred': self.frames_inferred,
+        }
@@ -0,0 +1,290 @@
+import collections
+import json
+import os
+import threading
+import time
+
+from arduino_link import ArduinoLink
+from helmet_detector import get_detector
+from motion_gate import MotionGate, offset_rows, parse_roi
+from profiling import NULL_PROFILER
+from smoothing import VerdictSmoother
+from stream import LatestFrameReader
+from verdict import CONFIDENCE_THRESHOLD, summarize_detections, to_numpy
+
+# Frames kept per source; older ones are dropped so a slow model never works on stale captures
+QUEUE_SIZE = 2
+
+
+class QueuedFrameReader(LatestFrameReader):
+    """
+    LatestFrameReader that keeps the newest `queue_size` frames instead of one,
+    and wakes a shared scheduler event whenever a frame arrives. Files read with
+    realtime=False wait for room in the queue instead of dropping frames.
+    """
+
+    def __init__(self, source=0, queue_size=QUEUE_SIZE, ready=None, **kwargs):
+        super().__init__(source, **kwargs)
+        self._frames = collections.deque(maxlen=queue_size)
+        self._ready = ready
+        self._block = not self.realtime and not self.is_live
+
+    def _publish(self, frame):
+        with self._cond:
+            while self._block and len(self._frames) == self._frames.maxlen and not self._stop.is_set():
+                self._cond.wait(0.1)
+            if len(self._frames) == self._frames.maxlen:
+                self.frames_dropped += 1
+            self._frame_id += 1
+            self._frames.append((self._frame_id, frame))
+            self.frames_captured += 1
+            self._cond.notify_all()
+        if self._ready is not None:
+            self._ready.set()
+
+    def pending(self):
+        with self._cond:
+            return len(self._frames)
+
+    def take(self):
+        """
+        Pop the oldest queued (frame_id, frame), or (None, None) if the queue is empty.
+        """
+        with self._cond:
+            if not self._frames:
+                return None, None
+            item = self._frames.popleft()
+            self._cond.notify_all()
+            return item
+
+
+class Channel:
+    """
+    One camera entrance: its capture thread, verdict state and actuator.
+    """
+
+    def __init__(self, name, source, threshold=CONFIDENCE_THRESHOLD, arduino=None, gate=None,
+                 smoothing=True, realtime=True, queue_size=QUEUE_SIZE, ready=None, profiler=NULL_PROFILER):
+        self.name = name
+        self.threshold = threshold
+        self.arduino = arduino
+        self.gate = gate
+        self.smoother = VerdictSmoother(on_threshold=threshold, off_threshold=min(threshold, 0.3)) if smoothing else None
+        self.profiler = profiler
+        self.reader = QueuedFrameReader(source, queue_size=queue_size, ready=ready, realtime=realtime,
+                                        profiler=profiler)
+        self.state = None
+        self.processed = 0
+        self.state_changes = 0
+
+    @property
+    def exhausted(self):
+        return self.reader.finished and self.reader.pending() == 0
+
+    def update(self, frame_id, rows, origin=None, frame=None, evidence=None, telemetry=None):
+        """
+        Fold one frame's detections into this channel's state; returns the new state on a change.
+        `frame` (the full capture) is offered to `evidence` on a state change (every frame under
+        the 'every'/'all' policies) and the decision logged to `telemetry`, both under this channel's name.
+        """
+        with self.profiler.stage('postprocess'):
+            if origin is not None:
+                rows = offset_rows(to_numpy(rows), origin)
+            summary = summarize_detections(rows, self.threshold)
+            if self.smoother is not None:
+                verdict = self.smoother.update(summary['max_conf'], summary['verdict']) or self.state
+            else:
+                verdict = summary['verdict']
+        self.processed += 1
+        changed = verdict != self.state
+        if evidence is not None and verdict is not None and (changed or evidence.per_frame):
+            evidence.submit(frame, summary['rows'], verdict, tag=self.name)
+        if telemetry is not None:
+            telemetry.decision(self.name, summary['verdict'], summary['max_conf'], self.threshold,
+                               quality={'motion': self.gate.last_motion} if self.gate is not None else None,
+                               frame=frame_id, state=verdict)
+        if not changed:
+            return None
+        print(f"[MULTI] {self.name} frame {frame_id}: {self.state or '-'} -> {verdict}")
+        self.state = verdict
+        self.state_changes += 1
+        if self.arduino is not None:
+            with self.profiler.stage('actuate'):
+                self.arduino.send_verdict(verdict)
+        return verdict
+
+    def stats(self, elapsed):
+        stats = {
+            'frames_captured': self.reader.frames_captured,
+            'frames_dropped': self.reader.frames_dropped,
+            'frames_processed': self.processed,
+            'fps': self.processed / elapsed,
+            'state_changes': self.state_changes,
+            'final_state': self.state,
+        }
+        if self.gate is not None:
+            stats['gate'] = self.gate.stats()
+        if self.arduino is not None:
+            stats['arduino'] = self.arduino.stats()
+        return stats
+
+
+def load_config(spec):
+    """
+    Camera list from a JSON config file, or from plain sources (camera indices, RTSP URLs, files).
+
+    Config format:
+      {"defaults": {"threshold": 0.5},
+       "sources": [{"name": "gate1", "source": 0, "arduino_port": "COM3"},
+                   {"name": "gate2", "source": "rtsp://...", "arduino_port": "COM4", "roi": "0.2,0,0.6,1"}]}
+    """
+    if len(spec) == 1 and str(spec[0]).lower().endswith('.json') and os.path.isfile(spec[0]):
+        with open(spec[0], encoding='utf-8') as f:
+            config = json.load(f)
+        defaults = config.get('defaults', {})
+        entries = [dict(defaults, **entry) for entry in config['sources']]
+    else:
+        entries = [{'source': source} for source in spec]
+    for i, entry in enumerate(entries):
+        entry.setdefault('name', f"cam{i}")
+        if isinstance(entry['source'], str) and entry['source'].isdigit():
+            entry['source'] = int(entry['source'])
+    return entries
+
+
+def build_channels(entries, threshold=CONFIDENCE_THRESHOLD, smoothing=True, realtime=True,
+                   queue_size=QUEUE_SIZE, motion_gate=None, ready=None, use_arduino=True, profiler=NULL_PROFILER):
+    """
+    Channels for each config entry; serial ports are opened in parallel so board resets overlap.
+    """
+    links = {}
+    for entry in entries:
+        port = entry.get('arduino_port')
+        if use_arduino and port and port not in links:
+            links[port] = ArduinoLink(port)
+    openers = [threading.Thread(target=link.open, daemon=True) for link in links.values()]
+    for t in openers:
+        t.start()
+    for t in openers:
+        t.join()
+
+    channels = []
+    for entry in entries:
+        gate = None
+        method = entry.get('motion_gate', motion_gate)
+        if method or entry.get('roi'):
+            roi = parse_roi(entry['roi']) if entry.get('roi') else None
+            gate = MotionGate(roi=roi, method=method) if method else MotionGate(roi=roi, min_area=-1)
+        channels.append(Channel(entry['name'], entry['source'], threshold=entry.get('threshold', threshold),
+                                arduino=links.get(entry.get('arduino_port')), gate=gate, smoothing=smoothing,
+                                realtime=entry.get('realtime', realtime), queue_size=queue_size, ready=ready,
+                                profiler=profiler))
+    return channels
+
+
+def multi_helmet_detection(spec, detector=None, threshold=CONFIDENCE_THRESHOLD, max_batch=None,
+                           max_frames=None, duration=None, report_every=5.0, realtime=True, smoothing=True,
+                           queue_size=QUEUE_SIZE, motion_gate=None, use_arduino=True, evidence=None,
+                           telemetry=None, profiler=NULL_PROFILER):
+    """
+    Helmet detection on several sources with one shared model.
+
+    Every source has its own capture thread and bounded frame queue. The
+    scheduler visits sources round-robin, starting one past where the last
+    batch started, takes at most one frame per source per batch and runs the
+    batch in a single model call, so a busy camera cannot starve the others.
+    Each source keeps its own smoothed verdict and Arduino channel; scored
+    frames are offered to `evidence`, tagged with the source name.
+    """
+    if detector is None:
+        detector = get_detector()
+
+    ready = threading.Event()
+    channels = build_channels(load_config(spec), threshold=threshold, smoothing=smoothing, realtime=realtime,
+                              queue_size=queue_size, motion_gate=motion_gate, ready=ready,
+                              use_arduino=use_arduino, profiler=profiler)
+    max_batch = max_batch or len(channels)
+    if telemetry is not None:
+        for channel in channels:
+            telemetry.watch(channel.name, channel.gate)
+            telemetry.watch(channel.name, channel.arduino)
+    for channel in channels:
+        channel.reader.start()
+        print(f"[MULTI] {channel.name}: {channel.reader.source}"
+              + (f" -> Arduino {channel.arduino.port}" if channel.arduino is not None else ""))
+
+    processed = 0
+    batches = 0
+    start_at = 0
+    started = time.monotonic()
+    last_report = started
+    try:
+        while True:
+            ready.clear()
+            batch = []
+            order = channels[start_at:] + channels[:start_at]
+            for channel in order:
+                if len(batch) == max_batch:
+                    break
+                frame_id, frame = channel.reader.take()
+                if frame is None:
+                    continue
+                decision_start = time.perf_counter()
+                origin = None
+                full_frame = frame
+                if channel.gate is not None:
+                    with profiler.stage('preprocess'):
+                        if not channel.gate.check(frame):
+                            continue
+                        frame, origin = channel.gate.crop(frame)
+                batch.append((channel, frame_id, frame, origin, decision_start, full_frame))
+            start_at = (start_at + 1) % len(channels)
+
+            if batch:
+                with profiler.stage('infer'):
+                    results = detector.detect_batch([item[2] for item in batch])
+                for (channel, frame_id, _, origin, decision_start, full_frame), result in zip(batch, results):
+                    channel.update(frame_id, result.boxes.data, origin, full_frame, evidence, telemetry)
+                    profiler.record('total', time.perf_counter() - decision_start)
+                processed += len(batch)
+                batches += 1
+            elif all(channel.exhausted for channel in channels):
+                break
+            elif not any(channel.reader.pending() for channel in channels):
+                ready.wait(0.1)
+
+            now = time.monotonic()
+            if now - last_report >= report_every:
+                print(f"[MULTI] {processed / (now - started):.1f} frames/s over {len(channels)} sources, "
+                      f"mean batch {processed / max(batches, 1):.2f}, states "
+                      + ", ".join(f"{c.name}={c.state}" for c in channels))
+                last_report = now
+            if max_frames is not None and processed >= max_frames:
+                break
+            if duration is not None and now - started >= duration:
+                break
+    except KeyboardInterrupt:
+        print("\n[MULTI] Stopped by user")
+    finally:
+        for channel in channels:
+            channel.reader.stop()
+        for link in {id(c.arduino): c.arduino for c in channels if c.arduino is not None}.values():
+            link.close()
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    summary = {
+        'frames_processed': processed,
+        'batches': batches,
+        'mean_batch_size': processed / batches if batches else 0.0,
+        'fps': processed / elapsed,
+        'sources': {c.name: c.stats(elapsed) for c in channels},
+    }
+    print(f"[MULTI] Processed {processed} frames in {batches} batches over {elapsed:.1f}s "
+          f"({summary['fps']:.1f} frames/s, mean batch {summary['mean_batch_size']:.2f})")
+    for c in channels:
+        s = summary['sources'][c.name]
+        print(f"[MULTI]   {c.name}: {s['frames_processed']} processed, {s['frames_dropped']} dropped, "
+              f"{s['state_changes']} state changes, final {s['final_state']}")
+        if c.reader.error is not None:
+            print(f"[MULTI]   {c.name} error: {c.reader.error}")
+    return summary
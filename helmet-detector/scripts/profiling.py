@@ -0,0 +1,178 @@
+import bisect
+import collections
+import contextlib
+import json
+import os
+import threading
+import time
+
+# Pipeline stages in decision order; 'total' is capture-to-actuation for one decision
+STAGES = ('capture', 'preprocess', 'infer', 'postprocess', 'actuate', 'save', 'total')
+
+# Upper bounds (ms) of the cumulative latency histogram buckets
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000)
+
+
+class StageStats:
+    """
+    Latency record for one stage: a rolling window for percentiles plus
+    cumulative histogram buckets, count and sum.
+    """
+
+    def __init__(self, window):
+        self.samples = collections.deque(maxlen=window)
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)  # Last bucket is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.buckets[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        if not self.samples:
+            return 0.0
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+        return ordered[index]
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p95_ms': self.percentile(95),
+            'p99_ms': self.percentile(99),
+            'max_ms': self.max_ms,
+            'histogram': dict(zip([str(b) for b in BUCKETS_MS] + ['+Inf'], self.buckets)),
+        }
+
+
+def process_start_time():
+    """
+    Wall-clock time this process was launched (psutil, else /proc on Linux), or now when neither works.
+    """
+    try:
+        import psutil
+        return psutil.Process().create_time()
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = float(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - uptime + start_ticks / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+class StartupTimer:
+    """
+    Launch-to-first-decision timing for one process.
+
+    `mark()` keeps the first time each milestone is reached, in seconds since
+    the process was launched; a StageProfiler given this timer marks
+    'first_decision' on its first 'total' record.
+    """
+
+    def __init__(self, launched=None):
+        self.launched = launched if launched is not None else process_start_time()
+        self.marks = {}
+
+    def mark(self, name, announce=None):
+        if name in self.marks:
+            return self.marks[name]
+        elapsed = self.marks[name] = time.time() - self.launched
+        if announce:
+            print(f"[STARTUP] {announce} {elapsed:.2f}s after launch")
+        return elapsed
+
+
+class StageProfiler:
+    """
+    Per-stage wall-clock instrumentation with monotonic timers.
+
+    Use `with profiler.stage('infer'): ...` around a stage, or `record()`
+    for durations measured elsewhere (e.g. in a capture thread). A disabled
+    profiler costs one attribute check per stage.
+    """
+
+    def __init__(self, enabled=True, window=1000, startup=None):
+        self.enabled = enabled
+        self.window = window
+        self.startup = startup
+        self.stats = {}
+        self.last = {}  # Most recent duration (ms) per stage, for per-decision event logs
+        self.started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def record(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            stats = self.stats.get(name)
+            if stats is None:
+                stats = self.stats[name] = StageStats(self.window)
+            stats.add(seconds * 1000.0)
+            self.last[name] = seconds * 1000.0
+        if name == 'total' and self.startup is not None and 'first_decision' not in self.startup.marks:
+            self.startup.mark('first_decision', "First decision")
+
+    def histograms(self):
+        """
+        {stage: (per-bucket counts, count, total_ms)} copied under the lock, for metrics export.
+        """
+        with self._lock:
+            return {name: (list(s.buckets), s.count, s.total_ms) for name, s in self.stats.items()}
+
+    def report(self):
+        with self._lock:
+            names = [s for s in STAGES if s in self.stats] + sorted(set(self.stats) - set(STAGES))
+            report = {
+                'uptime_s': time.monotonic() - self.started,
+                'stages': {name: self.stats[name].summary() for name in names},
+            }
+        if self.startup is not None:
+            report['startup_s'] = dict(self.startup.marks)
+        return report
+
+    def print_report(self):
+        stages = self.report()['stages']
+        if not stages:
+            print("[PROFILE] No timings recorded")
+            return
+        print("\n" + "="*60)
+        print("STAGE TIMINGS (ms)")
+        print("="*60)
+        print(f"{'stage':<12}{'count':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+        for name, s in stages.items():
+            print(f"{name:<12}{s['count']:>8}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}"
+                  f"{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+        busiest = max((n for n in stages if n != 'total'), key=lambda n: stages[n]['p50_ms'], default=None)
+        if busiest:
+            print(f"Bottleneck (highest p50): {busiest}")
+
+    def dump_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+        print(f"[PROFILE] Timings written to {path}")
+
+
+# Shared disabled profiler used when callers don't pass one
+NULL_PROFILER = StageProfiler(enabled=False)
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Opt-in on-disk cache of per-image results, see ResultCache
+DEFAULT_CACHE_PATH = os.path.join(script_dir, '..', '.cache', 'results.sqlite')
+DEFAULT_MAX_ENTRIES = 10000
+
+_model_hashes = {}
+
+
+def content_hash(data):
+    """
+    Hex digest of raw image bytes; byte-identical files share a key.
+    """
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_hash(path):
+    """
+    content_hash() of a file, or None if it cannot be read. Safe to run in worker processes.
+    """
+    try:
+        with open(path, 'rb') as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+
+def model_hash(model_path):
+    """
+    Digest of the model weights (a file, or every file of an exported model directory),
+    memoised per (path, size, mtime) so it is computed once per process.
+    """
+    if os.path.isdir(model_path):
+        files = sorted(os.path.join(root, name) for root, _, names in os.walk(model_path) for name in names)
+    else:
+        files = [model_path]
+    stamp = tuple((f, os.path.getsize(f), os.path.getmtime(f)) for f in files)
+    digest = _model_hashes.get(stamp)
+    if digest is None:
+        h = hashlib.blake2b(digest_size=16)
+        for path in files:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    h.update(chunk)
+        digest = _model_hashes[stamp] = h.hexdigest()
+    return digest
+
+
+class ResultCache:
+    """
+    SQLite store of detection rows and verdicts keyed by image content hash,
+    model hash and threshold config, bounded to `max_entries` with LRU eviction.
+
+    A hit gives back the Nx6 rows ([x1, y1, x2, y2, confidence, class_id], in
+    original image coordinates) and the verdict, so repeat checks skip both
+    decoding and inference.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, model_path=None, threshold=0.5, max_entries=DEFAULT_MAX_ENTRIES,
+                 preprocess='full'):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        # Anything that changes the rows for the same bytes must be part of the key
+        self.config = (f"{model_hash(model_path) if model_path else 'unknown'}"
+                       f"|threshold={threshold:.4f}|preprocess={preprocess}")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, verdict TEXT, "
+                         "rows BLOB, created REAL, last_used REAL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)")
+        self._entries = self._db.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    def key(self, digest):
+        """
+        Cache key for an image's content_hash() under this model/threshold config.
+        """
+        return hashlib.blake2b(f"{digest}|{self.config}".encode(), digest_size=20).hexdigest()
+
+    def get(self, key):
+        """
+        (rows, verdict) for a key, or None on a miss.
+        """
+        with self._lock:
+            row = self._db.execute("SELECT verdict, rows FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        verdict, blob = row
+        import numpy as np
+        return np.frombuffer(blob, dtype=np.float32).reshape(-1, 6), verdict
+
+    def put(self, key, rows, verdict):
+        import numpy as np
+        now = time.time()
+        blob = np.ascontiguousarray(rows, dtype=np.float32).tobytes()
+        with self._lock:
+            inserted = self._db.execute("INSERT OR IGNORE INTO results VALUES (?, ?, ?, ?, ?)",
+                                        (key, str(verdict), blob, now, now)).rowcount
+            self._entries += inserted
+            excess = self._entries - self.max_entries
+            if excess > 0:
+                self._db.execute("DELETE FROM results WHERE key IN "
+                                 "(SELECT key FROM results ORDER BY last_used LIMIT ?)", (excess,))
+                self._entries -= excess
+                self.evictions += excess
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': self._entries,
+            'max_entries': self.max_entries,
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"[CACHE] {s['hits']} hits, {s['misses']} misses ({s['hit_rate']:.0%} hit rate), "
+              f"{s['evictions']} evicted, {s['entries']}/{s['max_entries']} entries in {self.path}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
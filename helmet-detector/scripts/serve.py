@@ -0,0 +1,227 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from helmet_detector import get_detector
+from profiling import NULL_PROFILER
+from verdict import CONFIDENCE_THRESHOLD, summarize_batch
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 20 * 1024 * 1024
+
+
+class MicroBatcher:
+    """
+    Groups frames submitted from many threads into one model call.
+
+    A single worker thread takes the first queued frame, then keeps collecting
+    until `max_batch` frames are waiting or `max_wait_ms` has passed since the
+    first one arrived, and runs them through the detector together.
+    """
+
+    def __init__(self, detector, max_batch=8, max_wait_ms=5.0, threshold=CONFIDENCE_THRESHOLD,
+                 profiler=NULL_PROFILER):
+        self.detector = detector
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.threshold = threshold
+        self.profiler = profiler
+        self.batches = 0
+        self.frames = 0
+        self.batch_sizes = [0] * (max_batch + 1)
+        self._queue = queue.Queue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='micro-batcher', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def submit(self, frame):
+        """
+        Queue one BGR frame; the Future resolves to its verdict dict.
+        """
+        future = Future()
+        self._queue.put((frame, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+        pending = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(pending) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                pending.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return pending
+
+    def _run(self):
+        while not self._stop.is_set():
+            pending = self._collect()
+            if not pending:
+                continue
+            started = time.perf_counter()
+            try:
+                results = self.detector.detect_batch([frame for frame, _, _ in pending])
+                infer_s = time.perf_counter() - started
+                self.profiler.record('infer', infer_s)
+                with self.profiler.stage('postprocess'):
+                    summaries = summarize_batch(results, self.threshold)
+            except Exception as e:
+                for _, future, _ in pending:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.frames += len(pending)
+            self.batch_sizes[len(pending)] += 1
+            for (_, future, queued_at), summary in zip(pending, summaries):
+                future.set_result({
+                    'verdict': str(summary['verdict']),
+                    'num_detections': summary['num_detections'],
+                    'detections': np.round(summary['rows'].astype(np.float64), 4).tolist(),
+                    'batch_size': len(pending),
+                    'queue_ms': round((started - queued_at) * 1000, 2),
+                    'infer_ms': round(infer_s * 1000, 2),
+                })
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'frames': self.frames,
+            'mean_batch_size': self.frames / self.batches if self.batches else 0.0,
+            'batch_sizes': {str(n): c for n, c in enumerate(self.batch_sizes) if c},
+            'queued': self._queue.qsize(),
+        }
+
+
+class DetectionHandler(BaseHTTPRequestHandler):
+    """
+    POST /detect with a JPEG/PNG body returns the verdict as JSON; GET /health returns batcher stats.
+    """
+
+    protocol_version = 'HTTP/1.1'  # Keep-alive, so clients reuse one connection per camera
+    server_version = 'HelmetDetector/1.0'
+    # Headers and body go out as separate writes; with Nagle on, the body waits for the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('', '/health'):
+            self._reply(200, {'status': 'ok', 'model': self.server.detector.model_path,
+                              'batcher': self.server.batcher.stats()})
+        else:
+            self._reply(404, {'error': f'unknown path {self.path}'})
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/detect':
+            self.close_connection = True
+            self._reply(404, {'error': f'unknown path {self.path}'})
+            return
+        if self.headers.get('Content-Length') is None:
+            self.close_connection = True  # Whatever body was sent can't be skipped
+            self._reply(411, {'error': 'Content-Length required'})
+            return
+        try:
+            length = int(self.headers['Content-Length'])
+        except ValueError:
+            self.close_connection = True
+            self._reply(400, {'error': 'invalid Content-Length'})
+            return
+        if not 0 < length <= MAX_BODY_BYTES:
+            self.close_connection = True
+            self._reply(400 if length <= 0 else 413, {'error': 'expected a JPEG/PNG request body'})
+            return
+        started = time.perf_counter()
+        profiler = self.server.profiler
+        data = self.rfile.read(length)
+        with profiler.stage('preprocess'):
+            frame = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_COLOR)
+        if frame is None:
+            self._reply(400, {'error': 'could not decode image'})
+            return
+        try:
+            result = self.server.batcher.submit(frame).result(timeout=self.server.request_timeout)
+        except Exception as e:
+            self._reply(500, {'error': str(e)})
+            return
+        profiler.record('total', time.perf_counter() - started)
+        if self.server.telemetry is not None:
+            source = self.headers.get('X-Camera') or self.client_address[0]
+            self.server.telemetry.decision(source, result['verdict'], threshold=self.server.batcher.threshold,
+                                           detections=result['num_detections'], batch_size=result['batch_size'])
+        result['server_ms'] = round((time.perf_counter() - started) * 1000, 2)
+        self._reply(200, result)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class DetectionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Many cameras connect at once; the default backlog of 5 makes extra connects wait for a SYN retry
+    request_queue_size = 128
+
+
+def serve_helmet_detection(host=DEFAULT_HOST, port=DEFAULT_PORT, detector=None, max_batch=8, max_wait_ms=5.0,
+                           threshold=CONFIDENCE_THRESHOLD, profiler=NULL_PROFILER, request_timeout=30.0,
+                           verbose=False, telemetry=None):
+    """
+    Serve one resident HelmetDetector over HTTP, micro-batching concurrent requests.
+    Each answered request is logged to `telemetry` under its X-Camera header (or client address).
+    Runs until interrupted.
+    """
+    if detector is None:
+        detector = get_detector()
+
+    batcher = MicroBatcher(detector, max_batch=max_batch, max_wait_ms=max_wait_ms,
+                           threshold=threshold, profiler=profiler).start()
+    server = DetectionServer((host, port), DetectionHandler)
+    server.detector = detector
+    server.batcher = batcher
+    server.profiler = profiler
+    server.request_timeout = request_timeout
+    server.verbose = verbose
+    server.telemetry = telemetry
+
+    print(f"[SERVE] Listening on http://{host}:{server.server_address[1]} "
+          f"(POST /detect, GET /health), max batch {max_batch}, max wait {max_wait_ms:g} ms")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n[SERVE] Stopped by user")
+    finally:
+        server.server_close()
+        batcher.stop()
+        stats = batcher.stats()
+        print(f"[SERVE] {stats['frames']} frames in {stats['batches']} batches "
+              f"(mean batch size {stats['mean_batch_size']:.2f})")
+    return batcher.stats()
@@ -0,0 +1,82 @@
+import numpy as np
+
+from verdict import HELMET_CLASS, NO_HELMET_CLASS, NUM_CLASSES, VERDICT_TABLE
+
+
+class VerdictSmoother:
+    """
+    Debounces per-frame results into a stable PASS/FAIL/CONFLICT/NO_DETECTION state.
+
+    Each frame's per-class max confidence is folded into an exponential moving
+    average. A class switches on when its average rises above `on_threshold`
+    and only switches off again below `off_threshold` (hysteresis). The stable
+    state changes only after the candidate verdict has held for
+    `settle_frames` consecutive frames, so one odd frame never reaches the
+    Arduino.
+    """
+
+    def __init__(self, alpha=0.4, on_threshold=0.5, off_threshold=0.3, settle_frames=3):
+        if off_threshold > on_threshold:
+            raise ValueError("off_threshold must not be above on_threshold")
+        self.alpha = alpha
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.settle_frames = settle_frames
+        self.reset()
+
+    def reset(self):
+        self.ema = np.zeros(NUM_CLASSES, dtype=np.float32)
+        self.present = np.zeros(NUM_CLASSES, dtype=bool)
+        self.state = None
+        self.candidate = None
+        self.candidate_frames = 0
+        self.frames = 0
+        self.raw_changes = 0
+        self.state_changes = 0
+        self._last_raw = None
+
+    def update(self, max_conf, raw_verdict=None):
+        """
+        Feed one frame's per-class max confidence (e.g. summarize_detections()['max_conf']).
+        Returns the new state when it changes, otherwise None.
+        """
+        max_conf = np.asarray(max_conf, dtype=np.float32)
+        if self.frames == 0:
+            self.ema[:] = max_conf
+        else:
+            self.ema += self.alpha * (max_conf - self.ema)
+        self.frames += 1
+
+        # Hysteresis: switch on above on_threshold, off only below off_threshold
+        self.present = np.where(self.present, self.ema >= self.off_threshold, self.ema > self.on_threshold)
+        candidate = VERDICT_TABLE[int(self.present[HELMET_CLASS]), int(self.present[NO_HELMET_CLASS])]
+
+        if raw_verdict is not None:
+            if raw_verdict != self._last_raw:
+                self.raw_changes += 1
+            self._last_raw = raw_verdict
+
+        if candidate == self.candidate:
+            self.candidate_frames += 1
+        else:
+            self.candidate = candidate
+            self.candidate_frames = 1
+
+        if candidate != self.state and self.candidate_frames >= self.settle_frames:
+            self.state = candidate
+            self.state_changes += 1
+            return self.state
+        return None
+
+    @property
+    def settled(self):
+        return self.state is not None and self.candidate == self.state
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'raw_changes': self.raw_changes,
+            'state_changes': self.state_changes,
+            'state': self.state,
+            'ema': [round(float(v), 3) for v in self.ema],
+        }
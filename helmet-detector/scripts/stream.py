@@ -0,0 +1,321 @@
+import cv2
+import os
+import threading
+import time
+
+from helmet_detector import get_detector
+from motion_gate import offset_rows
+from profiling import NULL_PROFILER
+from smoothing import VerdictSmoother
+from verdict import CONFIDENCE_THRESHOLD, summarize_detections, to_numpy
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+def list_images(directory):
+    """
+    Return the image files in a directory, sorted by name.
+    """
+    names = sorted(n for n in os.listdir(directory) if n.lower().endswith(IMAGE_EXTENSIONS))
+    return [os.path.join(directory, n) for n in names]
+
+
+def parse_source(source):
+    """
+    Camera indices arrive as strings on the command line; turn them back into ints.
+    """
+    if isinstance(source, str) and source.isdigit():
+        return int(source)
+    return source
+
+
+class LatestFrameReader:
+    """
+    Threaded capture loop that always holds the newest frame.
+
+    The source can be a camera index, a video file / RTSP URL or a directory
+    of images. Frames that arrive before the previous one was read are
+    dropped, so the consumer never works on a stale frame. Files and image
+    directories are paced at `fps` unless `realtime` is False. Time spent
+    grabbing each frame is recorded as the 'capture' stage of `profiler`.
+    """
+
+    def __init__(self, source=0, realtime=True, fps=None, loop=False, profiler=NULL_PROFILER):
+        self.source = parse_source(source)
+        self.profiler = profiler
+        self.realtime = realtime
+        self.fps = fps
+        self.loop = loop
+        self.frames_captured = 0
+        self.frames_dropped = 0
+        self.finished = False
+        self.error = None
+        self._frame = None
+        self._frame_id = 0
+        self._consumed_id = 0
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def is_live(self):
+        return isinstance(self.source, int) or str(self.source).startswith(('rtsp://', 'http://', 'https://'))
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='frame-reader', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        with self._cond:
+            self.finished = True
+            self._cond.notify_all()
+
+    def read(self, last_id=None, timeout=1.0):
+        """
+        Wait for a frame newer than `last_id` and return (frame_id, frame).
+        Returns (None, None) on timeout or once the source is exhausted.
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._frame is None or self._frame_id == last_id:
+                remaining = deadline - time.monotonic()
+                if self.finished or remaining <= 0:
+                    return None, None
+                self._cond.wait(remaining)
+            self._consumed_id = self._frame_id
+            return self._frame_id, self._frame
+
+    def _publish(self, frame):
+        with self._cond:
+            if self._frame is not None and self._consumed_id != self._frame_id:
+                self.frames_dropped += 1
+            self._frame = frame
+            self._frame_id += 1
+            self.frames_captured += 1
+            self._cond.notify_all()
+
+    def frames(self):
+        """
+        Yield every frame from the configured source until it runs out (no dropping).
+        """
+        if isinstance(self.source, str) and os.path.isdir(self.source):
+            paths = list_images(self.source)
+            if not paths:
+                raise RuntimeError(f"No images found in {self.source}")
+            while True:
+                for path in paths:
+                    frame = cv2.imread(path)
+                    if frame is not None:
+                        yield frame
+                if not self.loop:
+                    return
+
+        cap = cv2.VideoCapture(self.source)
+        if not cap.isOpened():
+            raise RuntimeError(f"Could not open video source {self.source}")
+        try:
+            if isinstance(self.source, int):
+                cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
+                cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+                cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Keep the driver queue short
+            if self.fps is None and not self.is_live:
+                self.fps = cap.get(cv2.CAP_PROP_FPS) or None
+            while True:
+                ret, frame = cap.read()
+                if not ret:
+                    if self.loop and not self.is_live:
+                        cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                        continue
+                    return
+                yield frame
+        finally:
+            cap.release()
+
+    def timed_frames(self):
+        """
+        frames(), recording how long each grab/decode took.
+        """
+        frames = self.frames()
+        while True:
+            start = time.perf_counter()
+            frame = next(frames, None)
+            if frame is None:
+                return
+            self.profiler.record('capture', time.perf_counter() - start)
+            yield frame
+
+    def _run(self):
+        next_due = time.monotonic()
+        try:
+            for frame in self.timed_frames():
+                if self._stop.is_set():
+                    break
+                if self.realtime and not self.is_live:
+                    interval = 1.0 / (self.fps or 30.0)
+                    delay = next_due - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_due = max(next_due + interval, time.monotonic() - interval)
+                self._publish(frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._cond:
+                self.finished = True
+                self._cond.notify_all()
+
+
+def iter_frames(source, realtime=True, profiler=NULL_PROFILER):
+    """
+    Yield (frame_id, frame) pairs from a source.
+
+    Live sources, and files read in real time, go through a LatestFrameReader
+    so stale frames are dropped. Recorded clips read with realtime=False yield
+    every frame, which is what offline comparisons need.
+    """
+    reader = LatestFrameReader(source, realtime=realtime, profiler=profiler)
+    if not realtime and not reader.is_live:
+        for frame_id, frame in enumerate(reader.timed_frames(), 1):
+            yield frame_id, frame
+        return
+
+    reader.start()
+    last_id = None
+    try:
+        while True:
+            frame_id, frame = reader.read(last_id)
+            if frame is None:
+                if reader.finished:
+                    break
+                continue
+            last_id = frame_id
+            yield frame_id, frame
+    finally:
+        reader.stop()
+        if reader.error is not None:
+            print(f"Error: {reader.error}")
+
+
+def stream_helmet_detection(source=0, detector=None, arduino=None, threshold=CONFIDENCE_THRESHOLD,
+                            max_frames=None, duration=None, report_every=5.0, realtime=True,
+                            smoother=None, smoothing=True, gate=None, evidence=None, telemetry=None,
+                            tiler=None, profiler=NULL_PROFILER):
+    """
+    Continuous helmet detection on the newest frame of a camera, video or image directory.
+    Prints every PASS/FAIL state change and the sustained FPS; never prompts.
+    Per-frame verdicts are debounced by a VerdictSmoother unless `smoothing` is False,
+    and settled state changes are queued on `arduino` (an ArduinoLink) when one is given.
+    With a MotionGate, frames without motion in its ROI are skipped and only the ROI crop is scored;
+    with a TiledFallback, frames without a confident detection are re-checked tile by tile.
+    Settled state changes (every scored frame under the 'every'/'all' policies) are handed to
+    `evidence` (an EvidenceWriter), which saves them off the hot path, and every scored frame
+    is logged to `telemetry`.
+    """
+    if detector is None:
+        detector = get_detector()
+    if smoother is None and smoothing:
+        smoother = VerdictSmoother(on_threshold=threshold, off_threshold=min(threshold, 0.3))
+
+    reader = LatestFrameReader(source, realtime=realtime, profiler=profiler).start()
+    print(f"[STREAM] Reading from {reader.source} - press Ctrl+C to stop")
+
+    state = None
+    processed = 0
+    last_id = None
+    started = time.monotonic()
+    last_report = started
+    try:
+        while True:
+            frame_id, frame = reader.read(last_id)
+            if frame is None:
+                if reader.finished:
+                    break
+                continue
+            last_id = frame_id
+            full_frame = frame
+            decision_start = time.perf_counter()
+            if gate is not None:
+                with profiler.stage('preprocess'):
+                    passed = gate.check(frame)
+                    if passed:
+                        frame, origin = gate.crop(frame)
+                if not passed:
+                    if duration is not None and time.monotonic() - started >= duration:
+                        break
+                    continue
+
+            # Ultralytics expects BGR numpy frames, so the capture is passed through as-is
+            with profiler.stage('infer'):
+                rows = detector.detect(frame).boxes.data
+                if tiler is not None:
+                    rows, _ = tiler.refine(detector, frame, rows, threshold)
+            with profiler.stage('postprocess'):
+                if gate is not None:
+                    rows = offset_rows(to_numpy(rows), origin)
+                frame_summary = summarize_detections(rows, threshold)
+                if smoother is not None:
+                    verdict = smoother.update(frame_summary['max_conf'], frame_summary['verdict']) or state
+                else:
+                    verdict = frame_summary['verdict']
+            processed += 1
+
+            changed = verdict != state
+            if changed:
+                print(f"[STREAM] Frame {frame_id}: {state or '-'} -> {verdict}")
+                state = verdict
+                if arduino is not None:
+                    with profiler.stage('actuate'):
+                        arduino.send_verdict(verdict)
+            profiler.record('total', time.perf_counter() - decision_start)
+            # Evidence carries the settled state the Arduino acts on, not the raw frame verdict
+            if evidence is not None and verdict is not None and (changed or evidence.per_frame):
+                evidence.submit(full_frame, frame_summary['rows'], verdict)
+            if telemetry is not None:
+                telemetry.decision(source, frame_summary['verdict'], frame_summary['max_conf'], threshold,
+                                   quality={'motion': gate.last_motion} if gate is not None else None,
+                                   frame=frame_id, state=verdict)
+
+            now = time.monotonic()
+            if now - last_report >= report_every:
+                print(f"[STREAM] {processed / (now - started):.1f} FPS sustained, "
+                      f"{reader.frames_dropped} stale frames dropped, state {state}")
+                last_report = now
+            if max_frames is not None and processed >= max_frames:
+                break
+            if duration is not None and now - started >= duration:
+                break
+    except KeyboardInterrupt:
+        print("\n[STREAM] Stopped by user")
+    finally:
+        reader.stop()
+
+    if reader.error is not None:
+        print(f"Error: {reader.error}")
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    summary = {
+        'frames_processed': processed,
+        'frames_captured': reader.frames_captured,
+        'frames_dropped': reader.frames_dropped,
+        'fps': processed / elapsed,
+        'final_state': state,
+    }
+    print(f"[STREAM] Processed {processed} frames in {elapsed:.1f}s "
+          f"({summary['fps']:.1f} FPS), dropped {reader.frames_dropped} stale frames")
+    if gate is not None:
+        summary['gate'] = gate.stats()
+        print(f"[STREAM] Motion gate: {gate.frames_gated} idle frames skipped, "
+              f"{gate.frames_inferred} sent for inference")
+    if tiler is not None:
+        summary['tiles'] = tiler.stats()
+        print(f"[STREAM] Tiles: {tiler.tiled_frames} frames re-checked tile by tile, "
+              f"{tiler.recovered} with a confident detection")
+    if smoother is not None:
+        summary.update(smoother.stats())
+        print(f"[STREAM] Smoothing: {smoother.raw_changes} raw verdict flips -> "
+              f"{smoother.state_changes} state changes sent")
+    return summary
@@ -0,0 +1,274 @@
+import collections
+import json
+import os
+import queue
+import threading
+import time
+
+from helmet_detector import CLASS_NAMES
+from profiling import BUCKETS_MS, NULL_PROFILER
+
+script_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Structured decision events, see EventLog
+EVENT_LOG_PATH = os.path.join(script_dir, '..', 'logs', 'events.jsonl')
+METRICS_PORT = 9108
+
+
+def escape_label(value):
+    """
+    A label value as the text exposition format requires: backslash, quote and newline escaped.
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class EventLog:
+    """
+    Buffered JSONL sink with size-based rotation (events.jsonl -> events.jsonl.1 ...).
+
+    `emit()` only puts the event dict on a bounded queue; a background thread
+    serialises whatever has accumulated, writes it in one call and flushes
+    every `flush_interval` seconds. If the queue is full the event is dropped
+    and counted, so logging never blocks a decision. Events that can't be
+    serialised or written are counted in `errors`; the thread keeps draining.
+    """
+
+    def __init__(self, path=EVENT_LOG_PATH, max_bytes=50 * 1024 * 1024, backups=5, flush_interval=1.0,
+                 queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.rotations = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._file = None
+        self._size = 0
+
+    def start(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = self._file.tell()
+        self._thread = threading.Thread(target=self._run, name='event-log', daemon=True)
+        self._thread.start()
+        return self
+
+    def emit(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+        self._file.close()
+
+    def _drain(self):
+        events = []
+        try:
+            while True:
+                events.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        lines = []
+        for event in events:
+            try:
+                lines.append(json.dumps(event, separators=(',', ':')) + '\n')
+            except (TypeError, ValueError):
+                self.errors += 1
+        if not lines:
+            return
+        data = ''.join(lines)
+        try:
+            if self.max_bytes and self._size + len(data) > self.max_bytes and self._size > 0:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+        except OSError:
+            self.errors += len(lines)
+            if self._file.closed:  # Rotation failed half-way; retry on the next drain
+                try:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                    self._size = self._file.tell()
+                except OSError:
+                    pass
+            return
+        self._size += len(data)
+        self.written += len(lines)
+
+    def _rotate(self):
+        self._file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._size = 0
+        self.rotations += 1
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self._drain()
+        self._drain()
+
+
+class Telemetry:
+    """
+    Decision events plus Prometheus-style metrics for one detect.py process.
+
+    `decision()` bumps an in-memory counter and hands an event to the
+    EventLog (if any). Everything else - stage latency histograms from the
+    StageProfiler, gate / serial / evidence / cache counters from the objects
+    registered with `watch()` - is read only when /metrics is scraped.
+    """
+
+    def __init__(self, event_log=None, profiler=NULL_PROFILER):
+        self.event_log = event_log
+        self.profiler = profiler
+        self.decisions = collections.Counter()
+        self._watched = []
+        self._server = None
+
+    def watch(self, source, obj):
+        """
+        Export the counters of a MotionGate, ArduinoLink, EvidenceWriter or ResultCache.
+        """
+        if obj is not None and all(obj is not seen for _, seen in self._watched):
+            self._watched.append((str(source), obj))
+        return obj
+
+    def decision(self, source, verdict, max_conf=None, threshold=None, quality=None, **fields):
+        source = str(source)
+        verdict = str(verdict)
+        self.decisions[(source, verdict)] += 1
+        if self.event_log is None:
+            return
+        event = {'ts': round(time.time(), 3), 'source': source, 'verdict': verdict}
+        if max_conf is not None:
+            event['max_conf'] = {CLASS_NAMES[i]: round(float(c), 4) for i, c in enumerate(max_conf)}
+        if threshold is not None:
+            event['threshold'] = threshold
+        if quality is not None:
+            event['quality'] = {k: round(float(v), 2) for k, v in quality.items()}
+        if self.profiler.enabled:
+            event['timings_ms'] = {k: round(v, 2) for k, v in list(self.profiler.last.items())}
+        event.update(fields)
+        self.event_log.emit(event)
+
+    def render_metrics(self):
+        """
+        Prometheus text exposition format (version 0.0.4).
+        """
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                label_text = ','.join(f'{k}="{escape_label(v)}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+
+        metric('helmet_decisions_total', 'counter', "Decisions by source and verdict",
+               [({'source': s, 'verdict': v}, n) for (s, v), n in sorted(self.decisions.items())])
+
+        gates, serial, evidence, cache = [], [], [], []
+        for source, obj in self._watched:
+            stats = obj.stats()
+            if 'frames_gated' in stats:
+                gates.append((source, stats))
+            elif 'write_errors' in stats:
+                serial.append((source, stats))
+            elif 'policy' in stats:
+                evidence.append((source, stats))
+            elif 'hits' in stats:
+                cache.append((source, stats))
+        if gates:
+            metric('helmet_frames_gated_total', 'counter', "Frames skipped by the motion gate",
+                   [({'source': s}, st['frames_gated']) for s, st in gates])
+            metric('helmet_frames_inferred_total', 'counter', "Frames passed by the motion gate",
+                   [({'source': s}, st['frames_inferred']) for s, st in gates])
+        if serial:
+            metric('helmet_serial_signals_total', 'counter', "Signals written to the Arduino",
+                   [({'port': st['port']}, st['signals_sent']) for _, st in serial])
+            metric('helmet_serial_errors_total', 'counter', "Failed serial writes",
+                   [({'port': st['port']}, st['write_errors']) for _, st in serial])
+            metric('helmet_serial_connected', 'gauge', "1 while the serial link is open",
+                   [({'port': st['port']}, int(st['connected'])) for _, st in serial])
+        if evidence:
+            metric('helmet_evidence_saved_total', 'counter', "Evidence frames written",
+                   [({'source': s}, st['saved']) for s, st in evidence])
+            metric('helmet_evidence_dropped_total', 'counter', "Evidence frames dropped on a full queue",
+                   [({'source': s}, st['dropped']) for s, st in evidence])
+        if cache:
+            metric('helmet_cache_hits_total', 'counter', "Result cache hits", [({}, st['hits']) for _, st in cache])
+            metric('helmet_cache_misses_total', 'counter', "Result cache misses",
+                   [({}, st['misses']) for _, st in cache])
+        if self.event_log is not None:
+            metric('helmet_events_dropped_total', 'counter', "Events dropped on a full log queue",
+                   [({}, self.event_log.dropped)])
+            metric('helmet_events_failed_total', 'counter', "Events that could not be serialised or written",
+                   [({}, self.event_log.errors)])
+
+        # Stage latencies straight from the profiler's histogram buckets
+        stages = self.profiler.histograms()
+        if stages:
+            lines.append("# HELP helmet_stage_seconds Per-stage latency")
+            lines.append("# TYPE helmet_stage_seconds histogram")
+            for name, (buckets, count, total_ms) in stages.items():
+                name = escape_label(name)
+                cumulative = 0
+                for bound, n in zip(BUCKETS_MS, buckets):
+                    cumulative += n
+                    lines.append(f'helmet_stage_seconds_bucket{{stage="{name}",le="{bound / 1000:g}"}} {cumulative}')
+                lines.append(f'helmet_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+                lines.append(f'helmet_stage_seconds_sum{{stage="{name}"}} {total_ms / 1000:.6f}')
+                lines.append(f'helmet_stage_seconds_count{{stage="{name}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def serve_metrics(self, host='0.0.0.0', port=METRICS_PORT):
+        """
+        Serve GET /metrics from a daemon thread.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.rstrip('/') != '/metrics':
+                    self.send_error(404)
+                    return
+                body = telemetry.render_metrics().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='metrics', daemon=True).start()
+        print(f"[METRICS] Serving http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+    def close(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self.event_log is not None:
+            self.event_log.close()
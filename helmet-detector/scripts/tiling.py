@@ -0,0 +1,106 @@
+import numpy as np
+
+from motion_gate import offset_rows
+from verdict import CONFIDENCE_THRESHOLD, to_numpy
+
+# Square tiles cut from the frame, and the inference size each tile is run at:
+# a 320 px tile at 640 is a 2x upscale, which is what lets the model see distant heads
+TILE_SIZE = 320
+TILE_IMGSZ = 640
+TILE_OVERLAP = 0.2
+
+# Duplicates from overlapping tiles are merged on intersection over the smaller box,
+# so a head cut in half by a tile border is absorbed by the whole one
+MERGE_OVERLAP = 0.6
+
+
+def tile_origins(length, tile, overlap=TILE_OVERLAP):
+    """
+    Start offsets of tiles covering [0, length), the last one flush with the edge.
+    """
+    if length <= tile:
+        return [0]
+    stride = max(1, int(tile * (1 - overlap)))
+    origins = list(range(0, length - tile, stride))
+    return origins + [length - tile]
+
+
+def merge_rows(rows, overlap=MERGE_OVERLAP):
+    """
+    Greedy per-class suppression of Nx6 rows, highest confidence first.
+    """
+    if len(rows) < 2:
+        return rows
+    rows = rows[np.argsort(-rows[:, 4], kind='stable')]
+    areas = np.maximum(rows[:, 2] - rows[:, 0], 0) * np.maximum(rows[:, 3] - rows[:, 1], 0)
+    keep = np.ones(len(rows), dtype=bool)
+    for i in range(len(rows)):
+        if not keep[i]:
+            continue
+        rest = np.flatnonzero(keep[i + 1:]) + i + 1
+        rest = rest[rows[rest, 5] == rows[i, 5]]
+        if not len(rest):
+            continue
+        w = np.minimum(rows[i, 2], rows[rest, 2]) - np.maximum(rows[i, 0], rows[rest, 0])
+        h = np.minimum(rows[i, 3], rows[rest, 3]) - np.maximum(rows[i, 1], rows[rest, 1])
+        inter = np.maximum(w, 0) * np.maximum(h, 0)
+        smaller = np.minimum(areas[i], areas[rest])
+        keep[rest[inter > overlap * np.maximum(smaller, 1e-6)]] = False
+    return rows[keep]
+
+
+class TiledFallback:
+    """
+    Sliced inference for riders too far away to be found on the whole frame.
+
+    `refine()` is given the rows from the normal (possibly low-resolution)
+    pass. Only when none of them reaches the threshold is the frame cut into
+    overlapping tiles, all tiles run through the model as one batch, and the
+    boxes shifted back and merged across tiles. Frames with a confident
+    detection cost nothing extra.
+    """
+
+    def __init__(self, tile=TILE_SIZE, overlap=TILE_OVERLAP, imgsz=TILE_IMGSZ, merge_overlap=MERGE_OVERLAP):
+        self.tile = tile
+        self.overlap = overlap
+        self.imgsz = imgsz
+        self.merge_overlap = merge_overlap
+        self.frames = 0
+        self.tiled_frames = 0
+        self.recovered = 0
+
+    def detect_tiles(self, detector, frame):
+        """
+        Nx6 rows for the whole frame, from one batched call over its tiles.
+        """
+        h, w = frame.shape[:2]
+        origins = [(x, y) for y in tile_origins(h, self.tile, self.overlap)
+                   for x in tile_origins(w, self.tile, self.overlap)]
+        tiles = [frame[y:y + self.tile, x:x + self.tile] for x, y in origins]
+        results = detector.detect_batch(tiles, imgsz=self.imgsz)
+        rows = [offset_rows(to_numpy(r.boxes.data), origin) for r, origin in zip(results, origins)]
+        return merge_rows(np.concatenate(rows).reshape(-1, 6), self.merge_overlap)
+
+    def refine(self, detector, frame, rows, threshold=CONFIDENCE_THRESHOLD):
+        """
+        (rows, tiled): `rows` unchanged when it already has a confident detection,
+        otherwise the merged tile detections.
+        """
+        rows = to_numpy(rows)
+        self.frames += 1
+        h, w = frame.shape[:2]
+        if np.any(rows[:, 4] > threshold) or (h <= self.tile and w <= self.tile):
+            return rows, False
+        self.tiled_frames += 1
+        tiled = self.detect_tiles(detector, frame)
+        tiled = merge_rows(np.concatenate([tiled, rows]), self.merge_overlap)
+        if np.any(tiled[:, 4] > threshold):
+            self.recovered += 1
+        return tiled, True
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'tiled_frames': self.tiled_frames,
+            'recovered': self.recovered,
+        }
@@ -0,0 +1,239 @@
+import itertools
+import time
+
+import numpy as np
+
+from helmet_detector import CLASS_NAMES, get_detector
+from motion_gate import motion_score, offset_rows, small_gray
+from profiling import NULL_PROFILER
+from stream import iter_frames
+from verdict import CONFIDENCE_THRESHOLD, HELMET_CLASS, NO_HELMET_CLASS, NUM_CLASSES, to_numpy
+
+# Detections below this confidence are not used to start or update tracks
+TRACK_CONFIDENCE = 0.25
+
+
+def iou_matrix(a, b):
+    """
+    Pairwise IoU between two sets of [x1, y1, x2, y2] boxes (NxM result).
+    """
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class Track:
+    """
+    One rider's head box, carried forward with a constant-velocity (alpha-beta) filter.
+    """
+
+    def __init__(self, track_id, row, frame_index):
+        self.id = track_id
+        self.box = np.asarray(row[:4], dtype=np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)
+        self.scores = np.zeros(NUM_CLASSES, dtype=np.float32)
+        self.peak = np.zeros(NUM_CLASSES, dtype=np.float32)
+        self.hits = 0
+        self.misses = 0
+        self.last_iou = 0.0
+        self.last_update = frame_index
+        self.first_seen = frame_index
+        self.verdict = None
+        self._observe(row)
+
+    def predict(self):
+        self.box = self.box + self.velocity
+
+    def update(self, row, frame_index, iou, alpha=0.6, beta=0.2):
+        dt = max(1, frame_index - self.last_update)
+        residual = np.asarray(row[:4], dtype=np.float32) - self.box
+        self.box = self.box + alpha * residual
+        self.velocity = self.velocity + beta * residual / dt
+        self.last_update = frame_index
+        self.last_iou = float(iou)
+        self.misses = 0
+        self._observe(row)
+
+    def _observe(self, row):
+        class_id = int(row[5])
+        if 0 <= class_id < NUM_CLASSES:
+            self.scores[class_id] += float(row[4])
+            self.peak[class_id] = max(self.peak[class_id], float(row[4]))
+        self.hits += 1
+
+    def decide(self, threshold=CONFIDENCE_THRESHOLD):
+        """
+        Helmet verdict from the accumulated per-class confidence of this track:
+        PASS needs helmet to outweigh no-helmet and to have been seen above `threshold`.
+        """
+        if self.scores[HELMET_CLASS] > self.scores[NO_HELMET_CLASS] and self.peak[HELMET_CLASS] > threshold:
+            return 'PASS'
+        return 'FAIL'
+
+
+class IoUTracker:
+    """
+    Greedy IoU tracker: model frames update tracks, skipped frames only predict.
+    A track is decided once it has `min_hits` model observations and is
+    dropped after `max_misses` model frames without a match.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_misses=3, min_hits=3, threshold=CONFIDENCE_THRESHOLD):
+        self.iou_threshold = iou_threshold
+        self.threshold = threshold
+        self.max_misses = max_misses
+        self.min_hits = min_hits
+        self.tracks = []
+        self.decisions = []
+        self._ids = itertools.count(1)
+
+    def predict(self):
+        for track in self.tracks:
+            track.predict()
+
+    def update(self, rows, frame_index):
+        """
+        Match Nx6 detection rows to the predicted tracks.
+        Returns the tracks that reached a decision on this frame.
+        """
+        rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+        matched_tracks = set()
+        matched_rows = set()
+        if self.tracks and len(rows):
+            ious = iou_matrix([t.box for t in self.tracks], rows[:, :4])
+            # Greedy assignment, best overlaps first
+            for flat in np.argsort(-ious, axis=None):
+                ti, ri = np.unravel_index(flat, ious.shape)
+                if ious[ti, ri] < self.iou_threshold:
+                    break
+                if ti in matched_tracks or ri in matched_rows:
+                    continue
+                self.tracks[ti].update(rows[ri], frame_index, ious[ti, ri])
+                matched_tracks.add(ti)
+                matched_rows.add(ri)
+
+        for ti, track in enumerate(self.tracks):
+            if ti not in matched_tracks:
+                track.misses += 1
+                track.last_iou = 0.0
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+        for ri in range(len(rows)):
+            if ri not in matched_rows:
+                self.tracks.append(Track(next(self._ids), rows[ri], frame_index))
+
+        decided = []
+        for track in self.tracks:
+            if track.verdict is None and track.hits >= self.min_hits:
+                track.verdict = track.decide(self.threshold)
+                self.decisions.append((track.id, track.verdict, frame_index))
+                decided.append(track)
+        return decided
+
+    def needs_model(self):
+        """
+        Tracker confidence check: undecided or poorly matched tracks want a fresh detection.
+        """
+        return any(t.verdict is None or t.last_iou < self.iou_threshold for t in self.tracks)
+
+
+def tracked_helmet_detection(source, detector=None, arduino=None, detect_every=5,
+                             motion_threshold=12.0, confidence=TRACK_CONFIDENCE, threshold=CONFIDENCE_THRESHOLD,
+                             max_frames=None, duration=None, realtime=True, gate=None, evidence=None,
+                             telemetry=None, profiler=NULL_PROFILER):
+    """
+    Detection-plus-tracking: the model runs every `detect_every` frames, on
+    sudden motion, or when the tracker is unsure; boxes are carried forward in
+    between. Every rider (track) gets exactly one PASS/FAIL decision, PASS
+    only when the helmet class was seen above `threshold`.
+    With a MotionGate, idle frames skip tracking entirely and only the ROI is sent to the model.
+    Rider decisions are handed to `evidence` and logged to `telemetry` when given.
+    Stops after `max_frames` frames or `duration` seconds, whichever comes first.
+    """
+    if detector is None:
+        detector = get_detector()
+
+    tracker = IoUTracker(threshold=threshold)
+    frames = 0
+    model_calls = 0
+    since_model = detect_every
+    last_gray = None
+    started = time.monotonic()
+    print(f"[TRACK] Reading from {source}, model every {detect_every} frames")
+    try:
+        for frame_id, frame in iter_frames(source, realtime=realtime, profiler=profiler):
+            if max_frames is not None and frames >= max_frames:
+                break
+            if duration is not None and time.monotonic() - started >= duration:
+                break
+            frames += 1
+            decision_start = time.perf_counter()
+            with profiler.stage('preprocess'):
+                passed = gate is None or gate.check(frame)
+                if passed:
+                    gray = small_gray(frame)
+                    run_model = (since_model >= detect_every or tracker.needs_model()
+                                 or motion_score(last_gray, gray) > motion_threshold)
+            if not passed:
+                continue
+
+            with profiler.stage('postprocess'):
+                tracker.predict()
+            if run_model:
+                with profiler.stage('infer'):
+                    if gate is not None:
+                        crop, origin = gate.crop(frame)
+                        rows = offset_rows(to_numpy(detector.detect(crop).boxes.data), origin)
+                    else:
+                        rows = to_numpy(detector.detect(frame).boxes.data)
+                with profiler.stage('postprocess'):
+                    rows = rows[rows[:, 4] > confidence]
+                    decided = tracker.update(rows, frame_id)
+                for track in decided:
+                    print(f"[TRACK] Rider #{track.id}: {track.verdict} "
+                          f"(frame {frame_id}, {track.hits} observations)")
+                    if arduino is not None:
+                        with profiler.stage('actuate'):
+                            arduino.send_verdict(track.verdict)
+                    if evidence is not None:
+                        evidence.submit(frame, rows, track.verdict, status=f"Rider #{track.id}",
+                                        tag=f"track{track.id}")
+                    if telemetry is not None:
+                        telemetry.decision(source, track.verdict, threshold=threshold, frame=frame_id,
+                                           track=track.id, observations=track.hits,
+                                           scores={CLASS_NAMES[i]: round(float(s), 3)
+                                                   for i, s in enumerate(track.scores)})
+                profiler.record('total', time.perf_counter() - decision_start)
+                model_calls += 1
+                since_model = 1
+                last_gray = gray
+            else:
+                since_model += 1
+    except KeyboardInterrupt:
+        print("\n[TRACK] Stopped by user")
+
+    elapsed = max(time.monotonic() - started, 1e-9)
+    saved = frames - model_calls
+    report = {
+        'frames': frames,
+        'model_calls': model_calls,
+        'model_calls_saved': saved,
+        'saved_pct': 100.0 * saved / frames if frames else 0.0,
+        'riders': len(tracker.decisions),
+        'decisions': [{'track': t, 'verdict': v, 'frame': f} for t, v, f in tracker.decisions],
+        'fps': frames / elapsed,
+    }
+    print(f"[TRACK] {frames} frames, {model_calls} model calls "
+          f"({saved} saved vs per-frame inference, {report['saved_pct']:.0f}%)")
+    print(f"[TRACK] {report['riders']} rider decision(s), {report['fps']:.1f} FPS")
+    if gate is not None:
+        report['gate'] = gate.stats()
+        print(f"[TRACK] Motion gate: {gate.frames_gated} idle frames skipped, "
+              f"{gate.frames_inferred} passed")
+    return report
@@ -0,0 +1,97 @@
+import numpy as np
+
+from helmet_detector import CLASS_NAMES
+
+# Default confidence threshold used by the image entry point
+CONFIDENCE_THRESHOLD = 0.5
+
+HELMET_CLASS = 0
+NO_HELMET_CLASS = 1
+NUM_CLASSES = len(CLASS_NAMES)
+
+# Verdict indexed by [helmet seen][no-helmet seen]
+VERDICT_TABLE = np.array([['NO_DETECTION', 'FAIL'],
+                          ['PASS', 'CONFLICT']], dtype=object)
+
+# Signal sent to the Arduino for each verdict (1=PASS, anything else fails safe)
+ARDUINO_SIGNALS = {
+    'PASS': b'1',
+    'FAIL': b'0',
+    'CONFLICT': b'0',
+    'NO_DETECTION': b'0',
+}
+
+
+def to_numpy(detections):
+    """
+    Move an Nx6 detection tensor/array ([x1, y1, x2, y2, confidence, class_id]) to NumPy with at most one copy.
+    """
+    if hasattr(detections, 'cpu'):
+        detections = detections.cpu().numpy()
+    return np.asarray(detections, dtype=np.float32).reshape(-1, 6)
+
+
+def summarize_detections(detections, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Vectorised summary of one result's detections.
+
+    Returns a dict with the NumPy rows, per-class max confidence (over all
+    detections), per-class counts above the threshold and the verdict.
+    """
+    rows = to_numpy(detections)
+    confidence = rows[:, 4]
+    class_ids = rows[:, 5].astype(np.intp)
+    known = (class_ids >= 0) & (class_ids < NUM_CLASSES)
+
+    max_conf = np.zeros(NUM_CLASSES, dtype=np.float32)
+    np.maximum.at(max_conf, class_ids[known], confidence[known])
+    counts = np.bincount(class_ids[known & (confidence > threshold)], minlength=NUM_CLASSES)
+
+    verdict = VERDICT_TABLE[int(counts[HELMET_CLASS] > 0), int(counts[NO_HELMET_CLASS] > 0)]
+    return {
+        'rows': rows,
+        'max_conf': max_conf,
+        'counts': counts,
+        'num_detections': len(rows),
+        'verdict': verdict,
+    }
+
+
+def summarize_batch(batch, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Vectorised summaries for a batch of results (or Nx6 arrays) in a single pass.
+    """
+    arrays = [to_numpy(item.boxes.data if hasattr(item, 'boxes') else item) for item in batch]
+    if not arrays:
+        return []
+    sizes = np.array([len(a) for a in arrays])
+    rows = np.concatenate(arrays)
+    image_idx = np.repeat(np.arange(len(arrays)), sizes)
+
+    confidence = rows[:, 4]
+    class_ids = rows[:, 5].astype(np.intp)
+    known = (class_ids >= 0) & (class_ids < NUM_CLASSES)
+    flat = image_idx * NUM_CLASSES + class_ids
+
+    max_conf = np.zeros(len(arrays) * NUM_CLASSES, dtype=np.float32)
+    np.maximum.at(max_conf, flat[known], confidence[known])
+    counts = np.bincount(flat[known & (confidence > threshold)], minlength=len(arrays) * NUM_CLASSES)
+    max_conf = max_conf.reshape(-1, NUM_CLASSES)
+    counts = counts.reshape(-1, NUM_CLASSES)
+
+    verdicts = VERDICT_TABLE[(counts[:, HELMET_CLASS] > 0).astype(np.intp),
+                             (counts[:, NO_HELMET_CLASS] > 0).astype(np.intp)]
+    return [{
+        'rows': arrays[i],
+        'max_conf': max_conf[i],
+        'counts': counts[i],
+        'num_detections': int(sizes[i]),
+        'verdict': verdicts[i],
+    } for i in range(len(arrays))]
+
+
+def verdict_for(detections, threshold=CONFIDENCE_THRESHOLD):
+    """
+    Turn the Nx6 detection rows of one result into PASS/FAIL/CONFLICT/NO_DETECTION.
+    """
+    return summarize_detections(detections, threshold)['verdict']